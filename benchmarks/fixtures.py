@@ -0,0 +1,231 @@
+"""Synthetic inputs for the benchmark suite.
+
+Everything the benchmarks use is generated in a scratch workspace: a fake recipe and
+build script, source archives, patches, a stub host Python, and a template cross
+environment whose interpreters are shims around the interpreter running the
+benchmarks. Nothing is downloaded.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import stat
+import subprocess
+import sys
+import tarfile
+import textwrap
+import zipfile
+from pathlib import Path
+
+from forge.cross import CrossVEnv
+
+SDK = "iphonesimulator"
+ARCH = "arm64"
+
+PACKAGE_NAME = "forge-bench"
+PACKAGE_VERSION = "1.0"
+
+# The number of files in each synthetic source archive, and the size of each file.
+SOURCE_FILES = 2000
+SOURCE_FILE_SIZE = 16 * 1024
+
+# The number of source files modified by the synthetic patch.
+PATCHED_FILES = 200
+
+
+def _write_script(path: Path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(content).lstrip(), encoding="utf-8")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _source_content(index: int) -> bytes:
+    # Compressible, but not trivially so.
+    line = f"int function_{index}_%d(void) {{ return %d; }}\n"
+    content = "".join(line % (n, n * index) for n in range(SOURCE_FILE_SIZE // 40))
+    return content.encode("ascii")
+
+
+def make_recipe(workspace: Path, suffix: str = ".tar.gz") -> Path:
+    """Write a recipe with a build script that does no compilation.
+
+    :param suffix: The suffix of the recipe's source archive.
+    :returns: The path of the recipe folder.
+    """
+    recipe_path = workspace / "recipes" / f"{PACKAGE_NAME}{suffix.replace('.', '-')}"
+    (recipe_path / "patches").mkdir(parents=True, exist_ok=True)
+    (recipe_path / "meta.yaml").write_text(
+        textwrap.dedent(
+            f"""
+            package:
+              name: {PACKAGE_NAME}
+              version: "{{{{ version|join('.') if version else '{PACKAGE_VERSION}' }}}}"
+
+            source:
+              url: https://example.com/{PACKAGE_NAME}-{{version}}{suffix}
+
+            patches:
+              - bench.patch
+
+            build:
+              number: 1
+              script_env:
+                - BENCH=1
+            """
+        ),
+        encoding="utf-8",
+    )
+    _write_script(
+        recipe_path / "build.sh",
+        """
+        #!/bin/sh
+        set -eu
+        mkdir -p "$PREFIX/lib"
+        cp src/file0000.c "$PREFIX/lib/"
+        """,
+    )
+
+    # A patch that modifies the first lines of a sample of the source files.
+    hunks = []
+    for index in range(PATCHED_FILES):
+        name = f"src/file{index:04d}.c"
+        first = _source_content(index).decode("ascii").splitlines()[0]
+        hunks.append(
+            f"--- a/{name}\n+++ b/{name}\n@@ -1 +1 @@\n"
+            f"-{first}\n+/* patched */ {first}\n"
+        )
+    (recipe_path / "patches" / "bench.patch").write_text(
+        "".join(hunks), encoding="utf-8"
+    )
+    return recipe_path
+
+
+def make_archives(workspace: Path) -> tuple[Path, Path]:
+    """Write a tarball and a zip file of synthetic sources.
+
+    :returns: The paths of the tarball and the zip file.
+    """
+    downloads = workspace / "downloads"
+    downloads.mkdir(parents=True, exist_ok=True)
+    prefix = f"{PACKAGE_NAME}-{PACKAGE_VERSION}"
+    tar_path = downloads / f"{prefix}.tar.gz"
+    zip_path = downloads / f"{prefix}.zip"
+
+    with (
+        tarfile.open(tar_path, "w:gz") as tar,
+        zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf,
+    ):
+        for index in range(SOURCE_FILES):
+            name = f"{prefix}/src/file{index:04d}.c"
+            content = _source_content(index)
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+            zf.writestr(name, content)
+
+    return tar_path, zip_path
+
+
+def make_host_python(workspace: Path) -> CrossVEnv:
+    """Write a stub of the host Python support package.
+
+    The host "interpreter" is a shim for the interpreter running the benchmarks, and
+    its sysconfig data is a placeholder; this is enough for forge to describe (and
+    clone) a template cross environment.
+
+    :returns: A cross environment for the stub host.
+    """
+    support_path = workspace / "support"
+    os.environ["MOBILE_FORGE_SUPPORT_PATH"] = str(support_path)
+
+    cross_venv = CrossVEnv(sdk=SDK, sdk_version=None, arch=ARCH)
+    _write_script(
+        cross_venv.host_python,
+        f"""
+        #!/bin/sh
+        exec {sys.executable} "$@"
+        """,
+    )
+    cross_venv.host_sysconfig.parent.mkdir(parents=True, exist_ok=True)
+    cross_venv.host_sysconfig.write_text(
+        f"build_time_vars = {{'HOST_GNU_TYPE': '{cross_venv.platform_triplet}'}}\n",
+        encoding="utf-8",
+    )
+    return cross_venv
+
+
+def make_template(workspace: Path, cross_venv: CrossVEnv):
+    """Write a template cross environment in the workspace.
+
+    The environment is a real virtual environment (so pip can install into it),
+    with shims that report the platform of the host as their platform.
+    """
+    venv_path = cross_venv.template_path
+    subprocess.run(
+        [sys.executable, "-m", "venv", str(venv_path)],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    # The shims replace the `python` link, so the versioned names must link directly
+    # to the interpreter.
+    bin_path = venv_path / "bin"
+    interpreter = os.path.realpath(bin_path / "python")
+    for name in ["python3", f"python3.{sys.version_info.minor}"]:
+        (bin_path / name).unlink(missing_ok=True)
+        os.symlink(interpreter, bin_path / name)
+
+    for name in ["python", "cross-python"]:
+        target = bin_path / name
+        target.unlink(missing_ok=True)
+        _write_script(
+            target,
+            f"""
+            #!/bin/sh
+            _PYTHON_HOST_PLATFORM={cross_venv.platform_identifier} \\
+                exec {bin_path / "python3"} "$@"
+            """,
+        )
+    _write_script(
+        bin_path / "build-python",
+        f"""
+        #!/bin/sh
+        exec {sys.executable} "$@"
+        """,
+    )
+    _write_script(
+        bin_path / "build-pip",
+        f"""
+        #!/bin/sh
+        exec {bin_path / "python3"} -m pip "$@"
+        """,
+    )
+
+    with (venv_path / "forge-template.json").open("w", encoding="utf-8") as f:
+        json.dump(cross_venv.template_descriptor(), f, indent=4)
+
+
+def make_wheel(workspace: Path) -> Path:
+    """Write a pure Python wheel that can be installed without an index.
+
+    :returns: The folder containing the wheel.
+    """
+    wheels = workspace / "bench-wheels"
+    wheels.mkdir(parents=True, exist_ok=True)
+    dist_info = "forge_bench_dep-1.0.dist-info"
+    with zipfile.ZipFile(wheels / "forge_bench_dep-1.0-py3-none-any.whl", "w") as zf:
+        zf.writestr("forge_bench_dep/__init__.py", "")
+        zf.writestr(
+            f"{dist_info}/METADATA",
+            "Metadata-Version: 2.1\nName: forge-bench-dep\nVersion: 1.0\n",
+        )
+        zf.writestr(
+            f"{dist_info}/WHEEL",
+            "Wheel-Version: 1.0\nGenerator: forge-bench\nRoot-Is-Purelib: true\n"
+            "Tag: py3-none-any\n",
+        )
+        zf.writestr(f"{dist_info}/RECORD", "")
+    return wheels
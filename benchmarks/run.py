@@ -0,0 +1,408 @@
+"""Measure the overhead of forge itself, separately from the tools it runs.
+
+Each benchmark exercises one of forge's orchestration steps against the synthetic
+inputs in ``fixtures.py``, so the suite runs offline, and doesn't need Xcode or a
+real host Python. Results are written as JSON, named for the commit that was
+measured, so that two commits can be compared:
+
+    $ python benchmarks/run.py
+    $ python benchmarks/run.py --compare benchmarks/results/abc1234.json \\
+        benchmarks/results/def5678.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Measure the forge in this checkout, not whichever forge happens to be installed.
+REPO_PATH = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_PATH / "src"))
+sys.path.insert(0, str(REPO_PATH / "benchmarks"))
+
+import fixtures  # noqa: E402
+
+from forge import archive, logger, package, wheelhouse  # noqa: E402
+from forge import subprocess as forge_subprocess  # noqa: E402
+from forge.package import Package  # noqa: E402
+
+# The number of lines of output produced by the subprocess throughput benchmark.
+OUTPUT_LINES = 200_000
+
+# Changes in the median time of a benchmark that are smaller than this fraction, or
+# than this number of seconds, aren't reported as regressions.
+THRESHOLD = 0.10
+NOISE_FLOOR = 0.005
+
+
+class Benchmark:
+    def __init__(self, name, run, setup=None, repeat=None):
+        """
+        :param name: The name of the benchmark.
+        :param run: The callable that is timed.
+        :param setup: A callable run (untimed) before each run of the benchmark.
+        :param repeat: The number of times to run the benchmark, if it differs from
+            the number requested for the suite.
+        """
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.repeat = repeat
+
+    def measure(self, repeat: int) -> dict:
+        walls = []
+        cpus = []
+        for _ in range(self.repeat or repeat):
+            if self.setup:
+                self.setup()
+            cpu = time.process_time()
+            start = time.perf_counter()
+            self.run()
+            # Logging is asynchronous; the cost of writing the log is part of the run.
+            logger.flush()
+            walls.append(time.perf_counter() - start)
+            cpus.append(time.process_time() - cpu)
+
+        return {
+            "wall": {"min": min(walls), "median": statistics.median(walls)},
+            # The CPU time used by forge itself, excluding any subprocesses.
+            "cpu": {"min": min(cpus), "median": statistics.median(cpus)},
+            "runs": walls,
+        }
+
+
+class Suite:
+    """The benchmarks, and the workspace they share."""
+
+    def __init__(self, workspace: Path):
+        self.workspace = workspace
+
+        self.recipe_path = fixtures.make_recipe(workspace)
+        self.zip_recipe_path = fixtures.make_recipe(workspace, suffix=".zip")
+        fixtures.make_archives(workspace)
+        self.wheels_path = fixtures.make_wheel(workspace)
+        self.cross_venv = fixtures.make_host_python(workspace)
+        fixtures.make_template(workspace, self.cross_venv)
+
+        self.builder = self.make_builder(self.recipe_path)
+        self.zip_builder = self.make_builder(self.zip_recipe_path)
+        self.clone_path = workspace / "clone"
+
+        # The environment used by the builds.
+        self.cross_venv.clone(location=self.builder.build_path)
+
+        # Installs use the local wheels; the wheelhouse is never filled.
+        wheelhouse.offline = True
+
+    def make_builder(self, recipe_path: Path):
+        builder = Package(str(recipe_path), version=None, build_number=None).builder(
+            self.cross_venv
+        )
+        builder.build_path.mkdir(parents=True, exist_ok=True)
+        (self.workspace / "logs").mkdir(exist_ok=True)
+        builder.log_file = logger.BuildLog(
+            self.workspace / "logs" / f"{recipe_path.name}.log", recipe_path.name
+        )
+        return builder
+
+    def close(self):
+        self.builder.log_file.close()
+        self.zip_builder.log_file.close()
+
+    ######################################################################
+    # Setup steps
+    ######################################################################
+
+    def clear_meta_caches(self):
+        package._meta_cache.clear()
+        package.meta_template.cache_clear()
+        package.meta_validator.cache_clear()
+
+    def remove_clone(self):
+        shutil.rmtree(self.clone_path, ignore_errors=True)
+
+    def reuse_environment(self):
+        self.cross_venv.reuse(self.builder.build_path)
+
+    def reuse_unprobed_environment(self):
+        self.reuse_environment()
+        self.cross_venv.probe_path.unlink(missing_ok=True)
+
+    def fresh_source(self):
+        source_path = self.workspace / "unpacked"
+        shutil.rmtree(source_path, ignore_errors=True)
+        archive.extract(self.builder.source_archive_path, source_path)
+
+    def remove_source(self):
+        shutil.rmtree(self.workspace / "unpacked", ignore_errors=True)
+
+    def remove_wheels(self):
+        for wheel in self.builder.output_path.glob("*.whl"):
+            wheel.unlink()
+
+    ######################################################################
+    # Benchmarks
+    ######################################################################
+
+    def benchmarks(self) -> list[Benchmark]:
+        source_path = self.workspace / "unpacked"
+        return [
+            Benchmark(
+                "load_meta.cold",
+                lambda: package.load_meta(self.recipe_path),
+                setup=self.clear_meta_caches,
+            ),
+            Benchmark(
+                "load_meta.warm",
+                lambda: package.load_meta(self.recipe_path),
+                repeat=100,
+            ),
+            Benchmark(
+                "load_recipes.cold",
+                lambda: package.load_recipes(REPO_PATH / "recipes"),
+                setup=self.clear_meta_caches,
+            ),
+            Benchmark(
+                "cross_venv.clone",
+                lambda: self.cross_venv.clone(location=self.clone_path),
+                setup=self.remove_clone,
+            ),
+            Benchmark(
+                "cross_venv.verify.cold",
+                self.cross_venv.verify,
+                setup=self.reuse_unprobed_environment,
+            ),
+            Benchmark(
+                "cross_venv.verify.warm",
+                self.cross_venv.verify,
+                setup=self.reuse_environment,
+            ),
+            Benchmark(
+                "pip_install",
+                lambda: self.cross_venv.pip_install(
+                    self.builder.log_file,
+                    ["forge-bench-dep"],
+                    update=True,
+                    paths=[self.wheels_path],
+                ),
+                setup=self.reuse_environment,
+            ),
+            Benchmark(
+                "unpack_source.tar",
+                lambda: self.builder.unpack_source(source_path),
+                setup=self.remove_source,
+            ),
+            Benchmark(
+                "unpack_source.zip",
+                lambda: self.zip_builder.unpack_source(source_path),
+                setup=self.remove_source,
+            ),
+            Benchmark(
+                "patch_source",
+                lambda: self.builder.patch_source(source_path),
+                setup=self.fresh_source,
+            ),
+            Benchmark(
+                "subprocess.run",
+                lambda: forge_subprocess.run(
+                    self.builder.log_file,
+                    [
+                        sys.executable,
+                        "-c",
+                        f"import sys\nfor i in range({OUTPUT_LINES}): "
+                        "sys.stdout.write(f'line {i} of compiler output\\n')",
+                    ],
+                ),
+            ),
+            Benchmark(
+                "make_wheel",
+                self.builder.make_wheel,
+                setup=self.prepare_wheel,
+            ),
+        ]
+
+    def prepare_wheel(self):
+        self.reuse_environment()
+        self.builder.output_path.mkdir(parents=True, exist_ok=True)
+        self.remove_wheels()
+        lib_path = self.builder.build_path / "wheel" / "opt" / "lib"
+        if not lib_path.is_dir():
+            archive.extract(self.builder.source_archive_path, lib_path)
+
+
+def git_commit() -> tuple[str, bool]:
+    """The commit of the checkout being measured, and whether it has changes."""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_PATH, text=True
+        ).strip()
+        dirty = bool(
+            subprocess.check_output(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=REPO_PATH,
+                text=True,
+            ).strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+    return commit, dirty
+
+
+def run_suite(args) -> int:
+    commit, dirty = git_commit()
+    output = args.output or (
+        REPO_PATH
+        / "benchmarks"
+        / "results"
+        / f"{commit}{'-dirty' if dirty else ''}.json"
+    )
+    console = sys.stdout
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="forge-bench-") as tmp:
+        workspace = Path(tmp).resolve()
+        cwd = Path.cwd()
+        os.chdir(workspace)
+        try:
+            # Build output is logged as usual, but isn't shown.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                suite = Suite(workspace)
+                try:
+                    for benchmark in suite.benchmarks():
+                        if args.filter and args.filter not in benchmark.name:
+                            continue
+                        result = benchmark.measure(args.repeat)
+                        results[benchmark.name] = result
+                        print(
+                            f"{benchmark.name:<24} "
+                            f"{result['wall']['median'] * 1000:10.1f} ms wall "
+                            f"{result['cpu']['median'] * 1000:10.1f} ms forge CPU",
+                            file=console,
+                        )
+                finally:
+                    suite.close()
+        finally:
+            os.chdir(cwd)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "dirty": dirty,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split(" ")[0],
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "benchmarks": results,
+            },
+            f,
+            indent=2,
+        )
+    print()
+    print(f"Results written to {output}")
+    return 0
+
+
+def compare(base_path: Path, new_path: Path, threshold: float) -> int:
+    """Compare two sets of results, and report any regressions.
+
+    :returns: 1 if any benchmark is slower by more than the threshold; 0 otherwise.
+    """
+    with base_path.open(encoding="utf-8") as f:
+        base = json.load(f)
+    with new_path.open(encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"{'benchmark':<24} {base['commit']:>12} {new['commit']:>12}   change")
+    regressions = []
+    for name, result in new["benchmarks"].items():
+        try:
+            before = base["benchmarks"][name]["wall"]["median"]
+        except KeyError:
+            print(f"{name:<24} {'-':>12} {result['wall']['median'] * 1000:>9.1f} ms")
+            continue
+
+        after = result["wall"]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold and after - before > NOISE_FLOOR:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<24} {before * 1000:>9.1f} ms {after * 1000:>9.1f} ms "
+            f"{change:+8.1%}{flag}"
+        )
+
+    if base["python"] != new["python"] or base["platform"] != new["platform"]:
+        print()
+        print("Warning: the results were measured in different environments.")
+
+    if regressions:
+        print()
+        print(f"{len(regressions)} benchmarks are more than {threshold:.0%} slower.")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure the overhead of forge's own orchestration"
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        help="Only run the benchmarks whose name contains this text.",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=5,
+        help="The number of times to run each benchmark. Defaults to 5.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help=(
+            "The file to which results are written. Defaults to "
+            "benchmarks/results/<commit>.json."
+        ),
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        type=Path,
+        metavar=("BASE", "NEW"),
+        help="Compare two result files, instead of running the benchmarks.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help=(
+            "The fractional slowdown that is reported as a regression. "
+            f"Defaults to {THRESHOLD}."
+        ),
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, threshold=args.threshold)
+    return run_suite(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
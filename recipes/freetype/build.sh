@@ -14,7 +14,11 @@ set -eu
     ZLIB_CFLAGS="-I$INSTALL_ROOT/include" \
     ZLIB_LIBS="-L$INSTALL_ROOT/lib -lz"
 
-make -j "$CPU_COUNT"
+# When forge runs a jobserver, MAKEFLAGS controls the number of parallel jobs.
+case "${MAKEFLAGS:-}" in
+    *--jobserver*) make ;;
+    *) make -j "$CPU_COUNT" ;;
+esac
 make install prefix="$PREFIX"
 
 mv "$PREFIX/include/freetype2/"* "$PREFIX/include"
@@ -9,7 +9,11 @@ set -eu
   --build="$BUILD_TRIPLET" \
   --without-turbojpeg \
   --without-simd
-make -j "$CPU_COUNT"
+# When forge runs a jobserver, MAKEFLAGS controls the number of parallel jobs.
+case "${MAKEFLAGS:-}" in
+    *--jobserver*) make ;;
+    *) make -j "$CPU_COUNT" ;;
+esac
 make install prefix="$PREFIX"
 
 rm -r "${PREFIX:?}/bin"
@@ -4,7 +4,11 @@ set -eu
 : "${PREFIX?ENV VAR MUST BE SET}"
 
 ./configure --host="$HOST_TRIPLET" --build="$BUILD_TRIPLET"
-make -j "$CPU_COUNT"
+# When forge runs a jobserver, MAKEFLAGS controls the number of parallel jobs.
+case "${MAKEFLAGS:-}" in
+    *--jobserver*) make ;;
+    *) make -j "$CPU_COUNT" ;;
+esac
 make install prefix="$PREFIX"
 
 find "$PREFIX" -type l -print0 | xargs -0 rm
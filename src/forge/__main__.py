@@ -1,13 +1,30 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
 from pathlib import Path
 
-from forge import logger
+from forge import (
+    build,
+    cache,
+    compiler_cache,
+    fetch,
+    jobserver,
+    logger,
+    logs,
+    merge,
+    pypi,
+    report,
+    subprocess,
+    wheel,
+    wheelhouse,
+)
 from forge.cross import CrossVEnv
 from forge.package import Package
+from forge.plan import BuildPlan
 from forge.pypi import get_pypi_versions
+from forge.scheduler import BuildJob, BuildScheduler
 
 
 def main() -> int:
@@ -15,16 +32,160 @@ def main() -> int:
         description="Build binary wheels for mobile platforms"
     )
     parser.add_argument("-v", "--verbose", action="store_true", help="Log more detail")
+    parser.add_argument(
+        "--console-rate",
+        type=int,
+        default=None,
+        help=(
+            "The maximum number of lines of build output per second to show on the "
+            "console; 0 shows only a summary. All output is always written to the "
+            "build log. Defaults to showing all output."
+        ),
+    )
+    parser.add_argument(
+        "--log-json",
+        type=Path,
+        default=None,
+        help=(
+            "Also write every log record (including debug output) to this file, as "
+            "JSON lines tagged with the build, phase, time and level."
+        ),
+    )
+    parser.add_argument(
+        "--log-compression",
+        choices=sorted(logs.COMPRESSIONS),
+        default="gzip",
+        help="The compression format for archived build logs. Defaults to gzip.",
+    )
+    parser.add_argument(
+        "--keep-logs",
+        type=int,
+        default=logs.keep,
+        help=(
+            "The number of archived build logs to keep for each package, platform "
+            f"and Python version. Defaults to {logs.keep}; 0 disables the archive."
+        ),
+    )
+    parser.add_argument(
+        "--wheel-compression-level",
+        type=int,
+        choices=range(10),
+        default=wheel.compression_level,
+        metavar="{0-9}",
+        help=(
+            "The zlib compression level of built wheels; 0 stores files without "
+            f"compression. Defaults to {wheel.compression_level}."
+        ),
+    )
     parser.add_argument(
         "--clean",
         action="store_true",
         help="Clean the build folder prior to building.",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Reuse the build folder and build environment of the previous build of "
+            "each package, reapplying only the patches that have changed."
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Build every package, even if its inputs haven't changed.",
+    )
+    parser.add_argument(
+        "--compiler-cache",
+        choices=compiler_cache.TOOLS,
+        default=None,
+        help=(
+            "Wrap the C and C++ compilers with a compiler cache. The cache is stored "
+            "in ./cache/compiler, and is shared by all builds."
+        ),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help=(
+            "Don't use the network to resolve requirements or query PyPI; only use "
+            "wheels that are already in the wheelhouse or the local wheel folders, "
+            "and PyPI metadata that has already been cached."
+        ),
+    )
+    parser.add_argument(
+        "--index-url",
+        help="The package index used to fill the wheelhouse. Defaults to PyPI.",
+    )
+    parser.add_argument(
+        "--merge-slices",
+        action="store_true",
+        help=(
+            "After building, merge the wheels for each architecture of an SDK (e.g., "
+            "the arm64 and x86_64 iphonesimulator wheels) into a single wheel."
+        ),
+    )
+    parser.add_argument(
+        "--merger",
+        choices=sorted(merge.MERGERS),
+        default=None,
+        help=(
+            "The tool used to merge binaries with --merge-slices. Defaults to lipo "
+            "if it is available; otherwise, python."
+        ),
+    )
     parser.add_argument(
         "--all-versions",
         action="store_true",
         help="Build all appropriate versions of each package.",
     )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the build graph and its critical path, without building.",
+    )
+    parser.add_argument(
+        "--fetch-only",
+        action="store_true",
+        help="Download the source archives for every build, without building.",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help=(
+            "Write a report of the time and resources used by each phase of each "
+            "build to this file. The report is written as JSON lines if the filename "
+            "ends with .jsonl; otherwise as a JSON document."
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "The number of package versions to build at the same time. Defaults to 1."
+        ),
+    )
+    parser.add_argument(
+        "--build-jobs",
+        type=int,
+        default=None,
+        help=(
+            "The number of parallel compiler jobs each build can use. Defaults to "
+            "the --cpu-budget, divided by the number of --jobs."
+        ),
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        type=int,
+        default=None,
+        help=(
+            "The total number of compiler jobs that can run at the same time, across "
+            "all builds. Only builds that use make are held to this limit; other "
+            "builds use their share of it. Defaults to the number of CPUs."
+        ),
+    )
     parser.add_argument(
         "-s",
         "--subset",
@@ -74,6 +235,41 @@ def main() -> int:
     if args.verbose:
         logger.verbose = True
 
+    # When builds run concurrently, show which build each line of output came from.
+    logger.console_prefix = args.jobs > 1
+    if args.log_json:
+        logger.add_sink(logger.JSONLSink(args.log_json))
+
+    subprocess.console_rate = args.console_rate
+
+    if args.no_cache:
+        cache.enabled = False
+
+    try:
+        compiler_cache.configure(args.compiler_cache)
+    except RuntimeError as e:
+        print()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    try:
+        logs.configure(args.log_compression)
+    except RuntimeError as e:
+        print()
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    logs.keep = args.keep_logs
+    logs.enabled = args.keep_logs > 0
+    wheel.compression_level = args.wheel_compression_level
+
+    build.incremental = args.incremental
+    build.build_jobs = args.build_jobs
+    build.package_jobs = args.jobs
+
+    wheelhouse.offline = args.offline
+    pypi.offline = args.offline
+    wheelhouse.index_url = args.index_url
+
     try:
         platforms = [
             (sdk, CrossVEnv.BASE_VERSION[args.host], arch)
@@ -183,8 +379,7 @@ def main() -> int:
     else:
         build_targets = args.build_targets
 
-    successes = []
-    failures = []
+    build_jobs = []
     for build_target in build_targets:
         if Path(build_target).is_dir():
             # If the build target is a directory, just build what it says.
@@ -226,10 +421,6 @@ def main() -> int:
                 build_number=build_number,
             )
 
-            # First build of each version must be clean;
-            # subsequent builds will be isolated by
-
-            first = True
             # Packages that generate -py3-none-any wheels only need to be built
             # on a single platform.
             if package_name_or_recipe in py_any_targets:
@@ -237,18 +428,62 @@ def main() -> int:
             else:
                 build_platforms = platforms
 
-            # Build the package for each required platform.
-            for sdk, sdk_version, arch in build_platforms:
-                cross_venv = CrossVEnv(sdk=sdk, sdk_version=sdk_version, arch=arch)
-                builder = package.builder(cross_venv)
-                success = builder.build(clean=first)
+            build_jobs.append(
+                BuildJob(
+                    package_name_or_recipe,
+                    version,
+                    package,
+                    [
+                        CrossVEnv(sdk=sdk, sdk_version=sdk_version, arch=arch)
+                        for sdk, sdk_version, arch in build_platforms
+                    ],
+                )
+            )
 
-                # If the build was successful, subsequent passes don't need to be clean.
-                if success:
-                    first = False
-                    successes.append((package_name_or_recipe, version, cross_venv.tag))
-                else:
-                    failures.append((package_name_or_recipe, version, cross_venv.tag))
+    # Order the builds so that each package is built after any of its requirements.
+    plan = BuildPlan(build_jobs)
+    if args.plan:
+        plan.show()
+        return 0
+
+    # Download all the sources that will be needed before any build starts.
+    if not args.offline:
+        fetch.prefetch(
+            [builder for build_job in plan.build_jobs for builder in build_job.builders]
+        )
+    if args.fetch_only:
+        return 0
+
+    # All the builds take their compiler jobs from a shared pool.
+    jobserver.start(args.cpu_budget or os.cpu_count() or 1)
+    try:
+        BuildScheduler(jobs=args.jobs).run(plan.build_jobs)
+    finally:
+        jobserver.stop()
+        logger.flush()
+
+    if args.merge_slices:
+        print()
+        for build_job in plan.build_jobs:
+            try:
+                for merged in merge.merge_slices(
+                    build_job.builders, merger=args.merger
+                ):
+                    print(f"Merged wheel {merged.relative_to(Path.cwd())}")
+            except Exception as e:
+                print(f"Unable to merge wheels for {build_job}: {e}")
+
+    successes = []
+    failures = []
+    for build_job in build_jobs:
+        for builder, (cross_venv, success) in zip(
+            build_job.builders, build_job.results, strict=False
+        ):
+            result = (build_job.name, build_job.version, cross_venv.tag)
+            if success:
+                successes.append(result)
+            else:
+                failures.append((*result, builder.diagnosis))
 
     if successes:
         print()
@@ -259,8 +494,19 @@ def main() -> int:
     if failures:
         print()
         print("Failed builds for:")
-        for name, version, tag in failures:
+        for name, version, tag, diagnosis in failures:
             print(f" * {name} {version if version else '(default version)'} ({tag})")
+            for line in diagnosis:
+                print(f"     {line}")
+
+    if logs.enabled:
+        logs.prune()
+
+    report.show_slowest()
+    if args.report:
+        report.write(args.report)
+        print()
+        print(f"Build report written to {args.report}")
 
     print()
 
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Files up to this size are handed to a pool of threads to be written; larger files
+# are streamed to disk as they are decompressed.
+PARALLEL_WRITE_LIMIT = 1024 * 1024
+
+# The maximum number of files that can be waiting to be written by the pool.
+MAX_PENDING_WRITES = 256
+
+
+class ExtractStats:
+    """A summary of an archive extraction."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        rate = self.bytes / self.seconds if self.seconds else 0
+        return (
+            f"{self.files} files ({self.bytes / 1024 / 1024:.1f} MB) "
+            f"in {self.seconds:.2f}s ({rate / 1024 / 1024:.1f} MB/s)"
+        )
+
+
+def stripped_path(name: str, strip: int) -> str | None:
+    """Remove leading components from the path of an archive member.
+
+    This is the equivalent of ``tar --strip-components=<strip>``.
+
+    :param name: The path of the member in the archive.
+    :param strip: The number of leading components to remove.
+    :returns: The stripped path; or ``None`` if the member should be skipped because
+        it is one of the stripped components, or would be extracted outside the
+        target folder.
+    """
+    # The name is split exactly as tar does, so a leading "./" counts as a component.
+    parts = name.split("/", strip)
+    if len(parts) <= strip or not parts[strip]:
+        return None
+    path = parts[strip]
+    if path.startswith("/") or ".." in path.split("/"):
+        return None
+    return path
+
+
+class _Writer:
+    """Write extracted files, using a pool of threads for small files."""
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+        self.futures = []
+
+    def _write(self, path, data, mode, mtime):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("wb") as f:
+                f.write(data)
+            if mode is not None:
+                path.chmod(mode)
+            if mtime is not None:
+                os.utime(path, (mtime, mtime))
+        finally:
+            self.pending.release()
+
+    def write(self, path, data, mode=None, mtime=None):
+        self.pending.acquire()
+        self.futures.append(self.executor.submit(self._write, path, data, mode, mtime))
+
+    def stream(self, path, source, mode=None, mtime=None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            shutil.copyfileobj(source, f, 1024 * 1024)
+        if mode is not None:
+            path.chmod(mode)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        # Re-raise any error that occurred while writing.
+        for future in self.futures:
+            future.result()
+
+
+def _extract_tar(archive_path, target, strip, writer, stats):
+    links = []
+    # Open the archive in streaming mode, so members are extracted as they are read,
+    # rather than reading the full index of the archive first.
+    with tarfile.open(archive_path, "r|*") as tf:
+        for member in tf:
+            name = stripped_path(member.name, strip)
+            if name is None:
+                continue
+            path = target / name
+
+            if member.isdir():
+                path.mkdir(parents=True, exist_ok=True)
+            elif member.isreg():
+                source = tf.extractfile(member)
+                mode = member.mode & 0o777
+                if member.size <= PARALLEL_WRITE_LIMIT:
+                    writer.write(path, source.read(), mode, member.mtime)
+                else:
+                    writer.stream(path, source, mode, member.mtime)
+                stats.files += 1
+                stats.bytes += member.size
+            elif member.issym():
+                links.append((path, member.linkname, True))
+            elif member.islnk():
+                link_name = stripped_path(member.linkname, strip)
+                if link_name is not None:
+                    links.append((path, target / link_name, False))
+            # Device files and FIFOs aren't needed for a source tree.
+
+    return links
+
+
+def _extract_zip(archive_path, target, strip, writer, stats):
+    with zipfile.ZipFile(archive_path) as zf:
+        for info in zf.infolist():
+            name = stripped_path(info.filename, strip)
+            if name is None:
+                continue
+            path = target / name
+
+            if info.is_dir():
+                path.mkdir(parents=True, exist_ok=True)
+            elif info.file_size <= PARALLEL_WRITE_LIMIT:
+                writer.write(path, zf.read(info))
+                stats.files += 1
+                stats.bytes += info.file_size
+            else:
+                with zf.open(info) as source:
+                    writer.stream(path, source)
+                stats.files += 1
+                stats.bytes += info.file_size
+
+    return []
+
+
+def extract(archive_path: Path, target: Path, strip: int = 1, workers=None):
+    """Extract a tar or zip archive.
+
+    Tar archives are read in a single streaming pass. Small files are written by a pool
+    of threads while the archive continues to be decompressed; links are created once
+    all files have been written.
+
+    :param archive_path: The archive to extract.
+    :param target: The folder into which the archive will be extracted.
+    :param strip: The number of leading path components to remove from each member.
+    :param workers: The number of threads used to write files. Defaults to the number
+        of CPUs, up to a maximum of 8.
+    :returns: An ``ExtractStats`` describing the extraction.
+    :raises: ``RuntimeError`` if the archive isn't a tar or zip archive.
+    """
+    stats = ExtractStats()
+    start = time.perf_counter()
+    target.mkdir(parents=True, exist_ok=True)
+
+    writer = _Writer(workers or min(8, os.cpu_count() or 1))
+    try:
+        # Some packages (e.g., brotli) have uploaded a .tar.gz file... that is
+        # actually a zipfile (!).
+        if tarfile.is_tarfile(archive_path):
+            links = _extract_tar(archive_path, target, strip, writer, stats)
+        elif zipfile.is_zipfile(archive_path):
+            links = _extract_zip(archive_path, target, strip, writer, stats)
+        else:
+            raise RuntimeError(f"Can't identify archive type of {archive_path}")
+    finally:
+        writer.close()
+
+    for path, link_target, symbolic in links:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.is_symlink() or path.exists():
+            path.unlink()
+        if symbolic:
+            path.symlink_to(link_target)
+        else:
+            try:
+                os.link(link_target, path)
+            except OSError:
+                shutil.copy2(link_target, path)
+
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -1,23 +1,41 @@
 from __future__ import annotations
 
-import multiprocessing
+import itertools
+import json
 import os
 import re
 import shutil
 import sys
-import tarfile
-import zipfile
+import time
 from abc import ABC, abstractmethod, abstractproperty
 from email import generator, message
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import httpx
-from packaging.utils import canonicalize_name, canonicalize_version
-
-from forge import subprocess
-from forge.logger import log, log_exception
-from forge.pypi import get_pypi_source_urls
+from packaging.utils import (
+    InvalidWheelFilename,
+    canonicalize_name,
+    canonicalize_version,
+    parse_wheel_filename,
+)
+from packaging.version import Version
+
+from forge import (
+    archive,
+    cache,
+    compiler_cache,
+    fetch,
+    jobserver,
+    logs,
+    report,
+    subprocess,
+    triage,
+)
+from forge.logger import log, log_exception, open_build_log
+from forge.plan import parse_requirement
+from forge.pypi import get_pypi_source_digests, get_pypi_source_urls
+from forge.sources import SourceTreeCache
+from forge.wheel import WheelWriter
 
 try:
     import tomllib
@@ -29,12 +47,37 @@ if TYPE_CHECKING:
     from forge.cross import CrossVEnv
     from forge.package import Package
 
+# The number of parallel compiler jobs each build can use. If None, the CPU budget is
+# divided between the package builds that can run at the same time.
+build_jobs = None
+
+# The number of package builds that can run at the same time.
+package_jobs = 1
+
+# If True, builds reuse the build folder and build environment of the previous build
+# wherever possible, rather than starting from a clean checkout.
+incremental = False
+
 
 class Builder(ABC):
     def __init__(self, cross_venv: CrossVEnv, package: Package):
         self.cross_venv = cross_venv
         self.package = package
 
+        # The wheels produced by a successful build (or found in the build cache).
+        self.wheels = []
+
+        # A condensed description of the cause of a failed build.
+        self.diagnosis = []
+
+        # The build of another platform of the same package version, whose build
+        # environment can be copied rather than installed again. This is set by the
+        # job running the builds.
+        self.primary = None
+
+        # Has the build environment been prepared?
+        self.prepared = False
+
     @abstractproperty
     def build_path(self) -> Path:
         """The path in which all environment and sources for the build will be
@@ -56,6 +99,139 @@ class Builder(ABC):
         """The source archive file for the package."""
         ...
 
+    @abstractproperty
+    def output_path(self) -> Path:
+        """The folder where wheels produced by the build will be written."""
+        ...
+
+    def built_wheels(self, since: float) -> list[Path]:
+        """Find the wheels for this build in the output folder.
+
+        :param since: Only return wheels that have been modified since this timestamp.
+        :returns: The list of wheels that match the package, version and platform
+            of the build.
+        """
+        wheels = []
+        for wheel_path in sorted(self.output_path.glob("*.whl")):
+            try:
+                name, version, _, tags = parse_wheel_filename(wheel_path.name)
+            except InvalidWheelFilename:
+                continue
+
+            if (
+                name == canonicalize_name(self.package.name)
+                and version == Version(self.package.version)
+                and any(tag.platform in {self.cross_venv.tag, "any"} for tag in tags)
+                and wheel_path.stat().st_mtime >= since
+            ):
+                wheels.append(wheel_path)
+
+        return wheels
+
+    def build_inputs(self) -> dict:
+        """Describe everything that can affect the output of the build.
+
+        :returns: A JSON-serializable dictionary of build inputs.
+        """
+        if self.source_archive_path.is_file():
+            source = fetch.DownloadStore().digest(self.source_archive_path)
+        else:
+            source = self.download_source_url()
+
+        build_script = self.package.recipe_path / "build.sh"
+
+        return {
+            "meta": self.package.meta,
+            "patches": {
+                patch: cache.file_digest(self.package.recipe_path / "patches" / patch)
+                for patch in self.package.meta["patches"]
+            },
+            "build_script": (
+                cache.file_digest(build_script) if build_script.is_file() else None
+            ),
+            "source": source,
+            "host_requirements": self.host_requirement_wheels(),
+            "tag": self.cross_venv.tag,
+            "python": f"3.{sys.version_info.minor}",
+            "pip": self.cross_venv.PIP_VERSION,
+        }
+
+    def host_requirement_wheels(self) -> dict:
+        """Identify the local wheels that will satisfy the host requirements.
+
+        These are the wheels that forge has built for the requirements (e.g., a
+        library that the package links against). If several local wheels satisfy a
+        requirement, the one pip would choose (the highest version and build number)
+        is used. Requirements that aren't satisfied by a local wheel will be
+        installed from the package index.
+
+        :returns: A dictionary mapping each requirement to the filename and digest
+            of the wheel that satisfies it, or ``None`` if no local wheel does.
+        """
+        wheels = {}
+        for requirement in self.package.meta["requirements"]["host"]:
+            name, version = parse_requirement(requirement)
+            candidates = []
+            for folder in ["dist", "deps", "published"]:
+                for wheel_path in (Path.cwd() / folder).glob("*.whl"):
+                    try:
+                        (
+                            wheel_name,
+                            wheel_version,
+                            build_tag,
+                            tags,
+                        ) = parse_wheel_filename(wheel_path.name)
+                    except InvalidWheelFilename:
+                        continue
+
+                    if (
+                        wheel_name == name
+                        and (version is None or wheel_version == Version(version))
+                        and any(
+                            tag.platform in {self.cross_venv.tag, "any"} for tag in tags
+                        )
+                    ):
+                        candidates.append((wheel_version, build_tag, wheel_path))
+
+            if candidates:
+                wheel_path = max(candidates)[2]
+                wheels[requirement] = [
+                    wheel_path.name,
+                    cache.file_digest(wheel_path),
+                ]
+            else:
+                wheels[requirement] = None
+
+        return wheels
+
+    @property
+    def compile_jobs(self) -> int:
+        """The number of parallel compiler jobs the build can use.
+
+        This is ``build_jobs`` if it has been set; otherwise, an equal share of the CPU
+        budget for each package build that can run at the same time. A recipe can lower
+        this with the ``build.jobs`` setting.
+
+        Recipe builds that use ``make`` take their jobs from the jobserver instead, so
+        only they are held to the global budget. This limit is used by the build tools
+        that aren't clients of the jobserver (e.g., the parallel compilation of Python
+        extensions).
+        """
+        jobs = build_jobs or max(1, jobserver.budget() // package_jobs)
+        try:
+            return min(jobs, self.package.meta["build"]["jobs"])
+        except KeyError:
+            return jobs
+
+    def log_phase(self, phase: str, description: str):
+        """Log the start of a phase of the build, and start timing it.
+
+        :param phase: The name of the phase in the build report.
+        :param description: The description of the phase to show in the log.
+        """
+        log(self.log_file, f"\n[{self.cross_venv}] {description}")
+        report.start_phase(phase)
+
     def install_requirements(self, target):
         requirements = []
         for requirement in self.package.meta["requirements"][target]:
@@ -81,77 +257,87 @@ class Builder(ABC):
             log(self.log_file, f"No {target} requirements.")
 
     @abstractmethod
-    def download_source_url(self): ...
+    def download_source_url(self):
+        """The URL of the source archive for the package.
+
+        :raises: ``RuntimeError`` if the package doesn't have a source archive that
+            can be downloaded.
+        """
+        ...
+
+    def source_sha256(self) -> str | None:
+        """The expected sha256 digest of the source archive, if it is known."""
+        return None
 
     def download_source(self):
         """Download the source tarball."""
         url = self.download_source_url()
         log(self.log_file, f"Downloading {url}...", end="", flush=True)
-        self.source_archive_path.parent.mkdir(parents=True, exist_ok=True)
-        with httpx.stream("GET", url, follow_redirects=True) as response:
-            with self.source_archive_path.open("wb") as f:
-                for i, chunk in enumerate(response.iter_bytes()):
-                    if i % 100 == 0:
-                        log(self.log_file, ".", end="", flush=True)
-                    f.write(chunk)
+        chunks = itertools.count()
+
+        def progress(size):
+            if next(chunks) % 100 == 0:
+                log(self.log_file, ".", end="", flush=True)
+
+        fetch.DownloadStore().fetch(
+            url,
+            self.source_archive_path,
+            sha256=self.source_sha256(),
+            progress=progress,
+        )
         log(self.log_file, " done.")
 
-    def unpack_source(self):
+    @property
+    def source_strip(self) -> int:
+        """The number of leading path components to strip when unpacking sources."""
+        # By default, this is 1; but some source types can override.
+        try:
+            return self.package.meta["source"]["strip"]
+        except (TypeError, KeyError):
+            return 1
+
+    def unpack_source(self, path: Path):
+        """Unpack the source archive.
+
+        :param path: The folder into which the sources will be unpacked.
+        """
         log(
             self.log_file,
             f"Unpacking {self.source_archive_path.relative_to(Path.cwd())}...",
         )
-        # Determine the stripping level. By default, this is 1;
-        # but some source types can override.
-        try:
-            strip = self.package.meta["source"]["strip"]
-        except (TypeError, KeyError):
-            strip = 1
-
-        # Some packages (e.g., brotli) have uploaded a .tar.gz file... that is
-        # actually a zipfile (!).
-        if tarfile.is_tarfile(self.source_archive_path):
-            # This is the equivalent of --strip-components=<strip>
-            def members(tf: tarfile.TarFile, strip=1):
-                for member in tf.getmembers():
-                    parts = member.path.split("/", strip)
-                    try:
-                        if parts[strip]:
-                            member.path = parts[strip]
-                            yield member
-                    except IndexError:
-                        pass
-
-            with tarfile.open(self.source_archive_path) as tf:
-                tf.extractall(
-                    path=self.build_path,
-                    members=members(tf, strip=strip) if strip else None,
-                )
-
-        elif zipfile.is_zipfile(self.source_archive_path):
-            # Strip the top level folder.
-            zf = zipfile.ZipFile(self.source_archive_path)
+        stats = archive.extract(self.source_archive_path, path, strip=self.source_strip)
+        log(self.log_file, f"Unpacked {stats}.")
+
+    def apply_patch(self, path: Path, patchfile: Path, reverse=False):
+        """Apply a patch to the sources.
+
+        :param path: The folder containing the sources to patch.
+        :param patchfile: The patch to apply.
+        :param reverse: Should the patch be reversed, rather than applied?
+        """
+        # This can use a raw subprocess.run because it's a system command,
+        # not anything dependent on the Python environment.
+        subprocess.run(
+            self.log_file,
+            [
+                "patch",
+                "-p1",
+                "--ignore-whitespace",
+                "--quiet",
+            ]
+            + (["--reverse"] if reverse else [])
+            + [
+                "--input",
+                str(patchfile),
+            ],
+            cwd=path,
+        )
 
-            def members(zf, strip=1):
-                for member in zf.infolist():
-                    parts = member.filename.split("/", strip)
-                    try:
-                        if parts[strip]:
-                            member.filename = parts[strip]
-                            yield member
-                    except IndexError:
-                        pass
-
-            zf.extractall(
-                path=self.build_path,
-                members=members(zf, strip=strip) if strip else None,
-            )
-        else:
-            raise RuntimeError(
-                f"Can't identify archive type of {self.source_archive_path}"
-            )
+    def patch_source(self, path: Path):
+        """Apply the recipe's patches to the sources.
 
-    def patch_source(self):
+        :param path: The folder containing the sources to patch.
+        """
         patched = False
         for patch in self.package.meta["patches"]:
             patchfile = self.package.recipe_path / "patches" / patch
@@ -159,55 +345,199 @@ class Builder(ABC):
                 self.log_file,
                 f"Applying {patchfile.relative_to(self.package.recipe_path)}...",
             )
-            # This can use a raw subprocess.run because it's a system command,
-            # not anything dependent on the Python environment.
-            subprocess.run(
-                self.log_file,
-                [
-                    "patch",
-                    "-p1",
-                    "--ignore-whitespace",
-                    "--quiet",
-                    "--input",
-                    str(patchfile),
-                ],
-                cwd=self.build_path,
-            )
+            self.apply_patch(path, patchfile)
             patched = True
 
         if not patched:
             log(self.log_file, "No patches to apply.")
 
+    @property
+    def patch_state_path(self) -> Path:
+        """The folder that records the patches applied to the build folder."""
+        return self.build_path / ".forge-patches"
+
+    def current_patches(self) -> list[list[str]]:
+        """The recipe's patches, as a list of [name, digest] pairs."""
+        return [
+            [patch, cache.file_digest(self.package.recipe_path / "patches" / patch)]
+            for patch in self.package.meta["patches"]
+        ]
+
+    def record_patches(self):
+        """Record the patches that have been applied to the build folder.
+
+        A copy of each patch is kept, so that it can be reversed if the patch changes.
+        """
+        if self.patch_state_path.exists():
+            shutil.rmtree(self.patch_state_path)
+        self.patch_state_path.mkdir()
+
+        for index, patch in enumerate(self.package.meta["patches"]):
+            shutil.copy(
+                self.package.recipe_path / "patches" / patch,
+                self.patch_state_path / f"{index:03d}-{patch}",
+            )
+        with (self.patch_state_path / "applied.json").open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "source": fetch.DownloadStore().digest(self.source_archive_path),
+                    "patches": self.current_patches(),
+                },
+                f,
+                indent=4,
+            )
+
+    def update_patches(self) -> bool:
+        """Bring the patches applied to the build folder up to date.
+
+        Patches are compared with the patches that were applied, in order. From the
+        first patch that differs, the applied patches are reversed, and the recipe's
+        patches are applied; unchanged patches before that point are left alone. Only
+        the files touched by those patches are modified, so the build tools only need
+        to rebuild what depends on them.
+
+        :returns: ``True`` if the patches were updated; ``False`` if the build folder
+            can't be updated (e.g., because the source archive has changed), and must
+            be checked out again.
+        """
+        try:
+            with (self.patch_state_path / "applied.json").open(encoding="utf-8") as f:
+                applied = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+
+        if applied["source"] != fetch.DownloadStore().digest(self.source_archive_path):
+            return False
+
+        current = self.current_patches()
+        unchanged = 0
+        for applied_patch, current_patch in zip(
+            applied["patches"], current, strict=False
+        ):
+            if applied_patch != current_patch:
+                break
+            unchanged += 1
+
+        if unchanged == len(applied["patches"]) == len(current):
+            log(self.log_file, "Patches are unchanged.")
+            return True
+
+        for index in reversed(range(unchanged, len(applied["patches"]))):
+            name = applied["patches"][index][0]
+            log(self.log_file, f"Reversing previous version of {name}...")
+            self.apply_patch(
+                self.build_path,
+                self.patch_state_path / f"{index:03d}-{name}",
+                reverse=True,
+            )
+
+        for name, _ in current[unchanged:]:
+            log(self.log_file, f"Applying patches/{name}...")
+            self.apply_patch(
+                self.build_path, self.package.recipe_path / "patches" / name
+            )
+
+        self.record_patches()
+        return True
+
+    @property
+    def environment_stamp_path(self) -> Path:
+        """The file that records the requirements installed in the build
+        environment."""
+        return self.build_path / self.cross_venv.venv_name / "forge-requirements.json"
+
+    def environment_inputs(self) -> dict:
+        """Describe everything that is installed in the build environment.
+
+        This includes the local wheels that satisfy the host requirements, so the
+        environment is prepared again when one of them is rebuilt.
+
+        :returns: A JSON-serializable dictionary of environment inputs.
+        """
+        return {
+            "template": self.cross_venv.template_descriptor(),
+            "requirements": self.package.meta["requirements"],
+            "host_wheels": self.host_requirement_wheels(),
+        }
+
+    def prepare_environment(self):
+        """Create the cross environment for the build, and install requirements."""
+        # Create a clean cross environment from the template environment.
+        self.log_phase("create-env", "Create clean build environment")
+        self.cross_venv.clone(location=self.build_path, clean=True)
+
+        self.prepare_host_environment()
+
+        if self.primary:
+            self.log_phase(
+                "build-requirements",
+                f"Copy build environment from {self.primary.cross_venv}",
+            )
+            self.cross_venv.copy_build_environment(self.primary.cross_venv)
+        else:
+            self.prepare_build_environment()
+
+    def prepare_host_environment(self):
+        """Install the requirements that are specific to the platform of the build."""
+        self.log_phase("host-requirements", "Install forge host requirements")
+        self.install_requirements("host")
+
+    def prepare_build_environment(self):
+        """Install the tools that run on the build machine.
+
+        These are the same for every platform, so they are only installed by the first
+        build of a package version; see ``primary``.
+        """
+        self.log_phase("build-requirements", "Install forge build requirements")
+        self.install_requirements("build")
+
     def prepare(self, clean=True):
+        # An incremental build reuses whatever it can from the previous build.
+        if incremental:
+            clean = False
+
         if clean and self.build_path.is_dir():
             if clean:
-                log(self.log_file, f"\n[{self.cross_venv}] Clean up old builds")
+                self.log_phase("clean", "Clean up old builds")
                 log(
                     self.log_file,
                     f"Removing {self.build_path.relative_to(Path.cwd())}...",
                 )
                 shutil.rmtree(self.build_path)
 
-        if not self.source_archive_path.is_file():
-            log(self.log_file, f"\n[{self.cross_venv}] Download package sources")
+        store = fetch.DownloadStore()
+        if not store.is_valid(self.source_archive_path, self.source_sha256()):
+            self.log_phase("download", "Download package sources")
             self.download_source()
 
-        if not self.build_path.is_dir():
-            log(self.log_file, f"\n[{self.cross_venv}] Unpack sources")
-            self.unpack_source()
-
-            log(self.log_file, f"\n[{self.cross_venv}] Apply patches")
-            self.patch_source()
+        if incremental and self.build_path.is_dir():
+            self.log_phase("patch", "Update patches")
+            if not self.update_patches():
+                log(self.log_file, "Sources have changed; checking out again.")
+                shutil.rmtree(self.build_path)
 
-        # Create a clean cross environment.
-        log(self.log_file, f"\n[{self.cross_venv}] Create clean build environment")
-        self.cross_venv.create(location=self.build_path, clean=True)
+        if not self.build_path.is_dir():
+            SourceTreeCache().checkout(self)
+            self.record_patches()
 
-        log(self.log_file, f"\n[{self.cross_venv}] Install forge host requirements")
-        self.install_requirements("host")
+        # An incremental build can keep the build environment, as long as the
+        # requirements that were installed haven't changed.
+        inputs = self.environment_inputs()
+        if incremental:
+            try:
+                with self.environment_stamp_path.open(encoding="utf-8") as f:
+                    if json.load(f) == inputs:
+                        self.log_phase("create-env", "Reuse build environment")
+                        self.cross_venv.reuse(location=self.build_path)
+                        self.prepared = True
+                        return
+            except (FileNotFoundError, ValueError):
+                pass
 
-        log(self.log_file, f"\n[{self.cross_venv}] Install forge build requirements")
-        self.install_requirements("build")
+        self.prepare_environment()
+        with self.environment_stamp_path.open("w", encoding="utf-8") as f:
+            json.dump(inputs, f, indent=4)
+        self.prepared = True
 
     def compile_env(self, **kwargs) -> dict[str:str]:
         sysconfig_data = self.cross_venv.sysconfig_data
@@ -216,8 +546,8 @@ class Builder(ABC):
 
         ar = sysconfig_data["AR"]
 
-        cc = sysconfig_data["CC"]
-        cxx = sysconfig_data["CXX"]
+        cc = compiler_cache.wrap(sysconfig_data["CC"])
+        cxx = compiler_cache.wrap(sysconfig_data["CXX"])
 
         cflags = self.cross_venv.sysconfig_data["CFLAGS"]
 
@@ -268,6 +598,7 @@ class Builder(ABC):
             "LDFLAGS": ldflags,
             "INSTALL_ROOT": str(self.cross_venv.install_root),
         }
+        env.update(compiler_cache.compile_env(self))
         env.update(kwargs)
 
         # Add in some user environment keys that are useful
@@ -292,32 +623,72 @@ class Builder(ABC):
         if self.error_log_file_path.exists():
             self.error_log_file_path.unlink()
 
+        self.diagnosis = []
+        self.prepared = False
         self.log_file_path.parent.mkdir(parents=True, exist_ok=True)
-        with self.log_file_path.open("w", encoding="utf-8") as self.log_file:
+        with open_build_log(
+            self.log_file_path, self.log_file_path.stem
+        ) as self.log_file:
             log(self.log_file, "=" * 80)
             log(self.log_file, f"Building {self.package} for {self.cross_venv.tag}")
             log(self.log_file, "=" * 80)
-            try:
-                self.prepare(clean=clean)
-                self._build()
-                success = True
-            except Exception:
-                log(self.log_file, "*" * 80)
-                log(
-                    self.log_file,
-                    f"Failed build: {self.package} for {self.cross_venv.sdk} "
-                    f"{self.cross_venv.sdk_version} on {self.cross_venv.arch}",
-                )
-                log(self.log_file, "*" * 80)
-                log_exception(self.log_file)
-
-                success = False
+            with report.track(self) as build_record, triage.track() as analyzer:
+                try:
+                    report.start_phase("cache")
+                    build_cache = cache.BuildCache()
+                    wheels = build_cache.lookup(self) if cache.enabled else None
+                    if wheels:
+                        log(self.log_file, "Inputs are unchanged; using cached build:")
+                        for wheel in wheels:
+                            log(self.log_file, f"  {wheel.relative_to(Path.cwd())}")
+                        build_record.cached = True
+                        self.wheels = wheels
+                    else:
+                        started = time.time()
+                        self.prepare(clean=clean)
+                        report.start_phase("compile")
+                        with compiler_cache.stats(self):
+                            self._build()
+                        report.start_phase("cache")
+                        self.wheels = self.built_wheels(since=started)
+                        build_cache.store(self, self.wheels)
+                    success = True
+                except Exception as e:
+                    log(self.log_file, "*" * 80)
+                    log(
+                        self.log_file,
+                        f"Failed build: {self.package} for {self.cross_venv.sdk} "
+                        f"{self.cross_venv.sdk_version} on {self.cross_venv.arch}",
+                    )
+                    log(self.log_file, "*" * 80)
+                    log_exception(self.log_file)
+
+                    analyzer.exception = f"{type(e).__name__}: {e}"
+                    self.diagnosis = analyzer.summary()
+                    if self.diagnosis:
+                        log(self.log_file)
+                        log(self.log_file, "\n".join(self.diagnosis))
+
+                    success = False
+                build_record.success = success
 
         # If the build failed, move the log file to the error location.
         if not success:
             self.error_log_file_path.parent.mkdir(parents=True, exist_ok=True)
             shutil.move(self.log_file_path, self.error_log_file_path)
 
+        # Keep a compressed copy of the log in the archive. The plain log also stays
+        # in the logs (or errors) folder, until the next build of the package on
+        # this platform.
+        if logs.enabled:
+            log_path = self.log_file_path if success else self.error_log_file_path
+            try:
+                logs.archive(
+                    self, log_path, success, build_record.cached, build_record.wall
+                )
+            except (OSError, RuntimeError) as e:
+                log(None, f"Unable to archive {log_path.name}: {e}")
+
         return success
 
     @abstractmethod
@@ -358,7 +729,16 @@ class SimplePackageBuilder(Builder):
             / f"{self.package.name}-{self.package.version}-{self.cross_venv.tag}.log"
         )
 
+    @property
+    def output_path(self) -> Path:
+        # Non-Python packages are only used as build dependencies.
+        return Path.cwd() / "deps"
+
     def download_source_url(self):
+        if self.package.meta["source"] is None:
+            raise RuntimeError(
+                f"{self.package.name} doesn't have a source archive to download."
+            )
         return self.package.meta["source"]["url"].format(
             version=self.package.meta["package"]["version"],
             build=self.package.meta["build"]["number"],
@@ -366,13 +746,21 @@ class SimplePackageBuilder(Builder):
             arch=self.cross_venv.arch,
         )
 
+    def source_sha256(self) -> str | None:
+        try:
+            sha256 = self.package.meta["source"]["sha256"]
+        except (TypeError, KeyError):
+            return None
+
+        # Sources that vary by platform provide a digest for each archive.
+        if isinstance(sha256, dict):
+            return sha256.get(self.source_archive_path.name)
+        return sha256
+
     def prepare(self, clean=True):
-        # Always clean a non-Python build.
+        # Always clean a non-Python build (unless the build is incremental).
         super().prepare(clean=True)
 
-        log(self.log_file, f"\n[{self.cross_venv}] Installing wheel-building tools")
-        self.cross_venv.pip_install(self.log_file, ["wheel"], build=True)
-
     def write_message_file(self, filename, data):
         msg = message.Message()
         for key, value in data.items():
@@ -388,7 +776,7 @@ class SimplePackageBuilder(Builder):
         version = canonicalize_version(self.package.version)
         info_path = self.build_path / "wheel" / f"{name}-{version}.dist-info"
 
-        log(self.log_file, f"\n[{self.cross_venv}] Writing wheel metadata")
+        self.log_phase("make-wheel", "Writing wheel metadata")
         info_path.mkdir(exist_ok=True)
 
         # Write the packaging metadata
@@ -413,28 +801,22 @@ class SimplePackageBuilder(Builder):
             },
         )
 
-        # Re-pack the wheel file
+        # Pack the wheel file
         log(self.log_file, f"\n[{self.cross_venv}] Packing wheel")
-        self.cross_venv.run(
-            self.log_file,
-            [
-                "build-python",
-                "-m",
-                "wheel",
-                "pack",
-                str(self.build_path / "wheel"),
-                "--dest-dir",
-                str(Path.cwd() / "deps"),
-                "--build-number",
-                str(build_num),
-            ],
+        wheel_path = self.output_path / (
+            f"{name.replace('-', '_')}-{version}-{build_num}"
+            f"-py3-none-{self.cross_venv.tag}.whl"
         )
+        with WheelWriter(wheel_path, info_path.name) as writer:
+            writer.write_tree(self.build_path / "wheel")
 
     def compile(self):
+        # The build script's make takes its parallel jobs from the jobserver.
         script_env = {
+            **jobserver.compile_env(),
             "HOST_TRIPLET": self.cross_venv.platform_triplet,
             "BUILD_TRIPLET": f"{os.uname().machine}-apple-darwin",
-            "CPU_COUNT": str(multiprocessing.cpu_count()),
+            "CPU_COUNT": str(self.compile_jobs),
             "PREFIX": str(self.build_path / "wheel" / "opt"),
             "VERSION": self.package.version,
         }
@@ -449,6 +831,8 @@ class SimplePackageBuilder(Builder):
             ],
             cwd=self.build_path,
             env=self.compile_env(**script_env),
+            # Make the jobserver available to the build.
+            pass_fds=jobserver.fds(),
         )
 
     def _build(self):
@@ -466,6 +850,12 @@ class CMakePackageBuilder(SimplePackageBuilder):
 class PythonPackageBuilder(Builder):
     """A builder for projects available on PyPI."""
 
+    # Pins some dependencies as at end of 2024. This project is entirely to
+    # support historical builds, on historical Python versions; as such,
+    # we're isolating ourself from drift in tools over time.
+    SETUPTOOLS_DEPS = ["setuptools==75.6.0"]
+    BUILD_WHEEL_DEPS = ["build==1.2.2.post1", "wheel==0.45.1"]
+
     @property
     def source_archive_path(self) -> Path:
         return (
@@ -498,70 +888,167 @@ class PythonPackageBuilder(Builder):
             )
         )
 
-    def download_source_url(self):
-        return get_pypi_source_urls(self.package.name)[self.package.version]
-
-    def prepare(self, clean=True):
-        super().prepare(clean=clean)
+    @property
+    def output_path(self) -> Path:
+        # If the package is internal tooling, not for publication, output into
+        # the deps folder.
+        if self.package.name in {"oldest-supported-numpy"}:
+            return Path.cwd() / "deps"
+        else:
+            return Path.cwd() / "dist"
 
-        # Pins some dependencies as at end of 2024. This project is entirely to
-        # support historical builds, on historical Python versions; as such,
-        # we're isolating ourself from drift in tools over time.
+    def download_source_url(self):
+        try:
+            return get_pypi_source_urls(self.package.name)[self.package.version]
+        except KeyError:
+            raise RuntimeError(
+                f"PyPI doesn't provide a source distribution for "
+                f"{self.package.name} {self.package.version}."
+            ) from None
 
-        setuptools_deps = ["setuptools==75.6.0"]
-        build_wheel_deps = ["build==1.2.2.post1", "wheel==0.45.1"]
+    def source_sha256(self) -> str | None:
+        return get_pypi_source_digests(self.package.name).get(self.package.version)
 
-        # Install any build requirements (PEP517 or otherwise)
-        if (self.build_path / "pyproject.toml").is_file():
-            log(
-                self.log_file,
-                f"\n[{self.cross_venv}] Install pyproject.toml build requirements",
-            )
+    def build_inputs(self) -> dict:
+        inputs = super().build_inputs()
+        inputs["tools"] = self.SETUPTOOLS_DEPS + self.BUILD_WHEEL_DEPS
+        return inputs
 
-            # Install the requirements from pyproject.toml
+    def environment_inputs(self) -> dict:
+        inputs = super().environment_inputs()
+        inputs["tools"] = self.SETUPTOOLS_DEPS + self.BUILD_WHEEL_DEPS
+        try:
             with (self.build_path / "pyproject.toml").open("rb") as f:
-                pyproject = tomllib.load(f)
+                inputs["pyproject"] = tomllib.load(f)["build-system"]["requires"]
+        except (FileNotFoundError, KeyError):
+            inputs["pyproject"] = None
+        return inputs
 
-                # Install the build requirements in the cross environment
-                self.cross_venv.pip_install(
-                    self.log_file,
-                    build_wheel_deps + pyproject["build-system"]["requires"],
-                    paths=[
-                        Path.cwd() / "dist",
-                        Path.cwd() / "deps",
-                        Path.cwd() / "published",
-                    ],
-                )
+    def build_system_requires(self) -> list[str] | None:
+        """The build requirements declared in the project's pyproject.toml.
 
-                # Install the build requirements in the build environment
-                self.cross_venv.pip_install(
-                    self.log_file,
-                    build_wheel_deps + pyproject["build-system"]["requires"],
-                    paths=[
-                        Path.cwd() / "dist",
-                        Path.cwd() / "deps",
-                        Path.cwd() / "published",
-                    ],
-                    build=True,
-                )
-        else:
-            log(
+        :returns: The requirements, or ``None`` if the project doesn't have a
+            pyproject.toml (and is built with setuptools).
+        """
+        try:
+            with (self.build_path / "pyproject.toml").open("rb") as f:
+                return tomllib.load(f)["build-system"]["requires"]
+        except FileNotFoundError:
+            return None
+
+    def prepare_host_environment(self):
+        super().prepare_host_environment()
+
+        # Install any build requirements (PEP517 or otherwise) in the cross
+        # environment.
+        requires = self.build_system_requires()
+        if requires is not None:
+            self.log_phase(
+                "build-requirements", "Install pyproject.toml build requirements"
+            )
+            self.cross_venv.pip_install(
                 self.log_file,
-                f"\n[{self.cross_venv}] Installing non-PEP517 build requirements",
+                self.BUILD_WHEEL_DEPS + requires,
+                paths=[
+                    Path.cwd() / "dist",
+                    Path.cwd() / "deps",
+                    Path.cwd() / "published",
+                ],
+            )
+        else:
+            self.log_phase(
+                "build-requirements", "Installing non-PEP517 build requirements"
             )
             # Ensure the cross environment has the most recent tools
-            self.cross_venv.pip_install(self.log_file, setuptools_deps, update=True)
-            self.cross_venv.pip_install(self.log_file, build_wheel_deps)
+            self.cross_venv.pip_install(
+                self.log_file, self.SETUPTOOLS_DEPS, update=True
+            )
+            self.cross_venv.pip_install(self.log_file, self.BUILD_WHEEL_DEPS)
+
+    def prepare_build_environment(self):
+        super().prepare_build_environment()
 
+        # Install the same build requirements in the build environment.
+        requires = self.build_system_requires()
+        if requires is not None:
+            self.cross_venv.pip_install(
+                self.log_file,
+                self.BUILD_WHEEL_DEPS + requires,
+                paths=[
+                    Path.cwd() / "dist",
+                    Path.cwd() / "deps",
+                    Path.cwd() / "published",
+                ],
+                build=True,
+            )
+        else:
             # Ensure the build environment has the most recent tools
             self.cross_venv.pip_install(
-                self.log_file, setuptools_deps, update=True, build=True
+                self.log_file, self.SETUPTOOLS_DEPS, update=True, build=True
+            )
+            self.cross_venv.pip_install(
+                self.log_file, self.BUILD_WHEEL_DEPS, build=True
             )
-            self.cross_venv.pip_install(self.log_file, build_wheel_deps, build=True)
+
+    @property
+    def build_backend(self) -> str | None:
+        """The PEP 517 build backend of the project, if it declares one."""
+        try:
+            with (self.build_path / "pyproject.toml").open("rb") as f:
+                return tomllib.load(f)["build-system"]["build-backend"]
+        except (FileNotFoundError, KeyError):
+            return None
+
+    @property
+    def slice_build_path(self) -> Path:
+        """The folder for the intermediate outputs of the build.
+
+        All the platforms of a package version share the source tree in
+        ``build_path``; but each platform has its own folder for compiled objects, so
+        outputs are never mixed between platforms, and are kept for the next build of
+        the same platform.
+        """
+        return self.build_path / "build" / self.cross_venv.tag
+
+    def write_setup_config(self) -> Path:
+        """Write additional setuptools configuration for the build.
+
+        setuptools reads this from the file named by DIST_EXTRA_CONFIG. It puts the
+        build outputs in the slice build folder, and runs ``build_ext`` in parallel.
+
+        :returns: The path of the configuration file.
+        """
+        config_path = self.build_path / f"forge-setup-{self.cross_venv.tag}.cfg"
+        with config_path.open("w", encoding="utf-8") as f:
+            f.write(
+                f"[build]\nbuild_base = {self.slice_build_path}\n\n"
+                f"[build_ext]\nparallel = {self.compile_jobs}\n"
+            )
+        return config_path
+
+    def parallel_env(self) -> dict[str, str]:
+        """The environment variables that control parallel compilation.
+
+        Each build tool has its own way of being told how many compiler jobs to run.
+        """
+        jobs = str(self.compile_jobs)
+        return {
+            # numpy.distutils
+            "NPY_NUM_BUILD_JOBS": jobs,
+            # PyTorch-style extension builds
+            "MAX_JOBS": jobs,
+            "CMAKE_BUILD_PARALLEL_LEVEL": jobs,
+        }
 
     def _build(self):
         # Set up any additional environment variables needed in the script environment.
-        script_env = {}
+        # Settings from the recipe override the defaults for parallel compilation.
+        # Python builds aren't clients of the jobserver, so they aren't held to the
+        # global job budget.
+        script_env = {
+            "DIST_EXTRA_CONFIG": str(self.write_setup_config()),
+            **self.parallel_env(),
+        }
         for line in self.package.meta["build"]["script_env"]:
             key, value = line.split("=", 1)
             script_env[key] = value
@@ -569,17 +1056,27 @@ class PythonPackageBuilder(Builder):
         # Set the cross host platform in the environment
         script_env["_PYTHON_HOST_PLATFORM"] = self.cross_venv.platform_identifier
 
-        # If the package is internal tooling, not for publication, output into
-        # the deps folder.
-        if self.package.name in {"oldest-supported-numpy"}:
-            output_dir = str(Path.cwd() / "deps")
-        else:
-            output_dir = str(Path.cwd() / "dist")
-
         config_args = []
         for config in self.package.meta["build"]["config"]:
             config_args.extend(["-C", config])
 
+        # meson-python passes compile-args to ninja, and keeps its build folder in
+        # build-dir.
+        if self.build_backend == "mesonpy":
+            configured = {
+                config.split("=", 1)[0]
+                for config in self.package.meta["build"]["config"]
+            }
+            if "compile-args" not in configured:
+                config_args.extend(["-C", f"compile-args=-j{self.compile_jobs}"])
+            if "build-dir" not in configured:
+                config_args.extend(["-C", f"build-dir={self.slice_build_path}"])
+
+        # The build requirements were checked by the first build of the package
+        # version; the other platforms have the same requirements installed.
+        if self.primary:
+            config_args.append("--skip-dependency-check")
+
         self.cross_venv.run(
             self.log_file,
             [
@@ -589,7 +1086,7 @@ class PythonPackageBuilder(Builder):
                 "--no-isolation",
                 "--wheel",
                 "--outdir",
-                output_dir,
+                str(self.output_path),
                 "-v",
             ]
             + config_args,
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# Can the wheels from previous builds be reused?
+enabled = True
+
+
+def file_digest(path: Path) -> str:
+    """Compute the sha256 digest of a file.
+
+    :param path: The file to hash.
+    :returns: The hex digest of the file's content.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """A record of the wheels produced by previous builds.
+
+    Each entry is keyed on a hash of everything that was used as an input to the
+    build, as reported by ``Builder.build_inputs()``. If the inputs of a build match
+    an entry, and the wheels recorded in that entry still exist, the build doesn't
+    need to be performed again.
+    """
+
+    @property
+    def path(self) -> Path:
+        """The location of the cache entries."""
+        return Path.cwd() / "cache" / "builds"
+
+    def key(self, builder: Builder) -> str:
+        """Compute the cache key for a build.
+
+        :param builder: The builder for the build.
+        :returns: A hex digest of the inputs to the build.
+        """
+        inputs = json.dumps(builder.build_inputs(), sort_keys=True, default=str)
+        return hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+
+    def lookup(self, builder: Builder) -> list[Path] | None:
+        """Find the wheels produced by a previous build with the same inputs.
+
+        :param builder: The builder for the build.
+        :returns: The list of previously built wheels, or ``None`` if there is no
+            usable entry in the cache.
+        """
+        entry_path = self.path / f"{self.key(builder)}.json"
+        try:
+            with entry_path.open(encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        wheels = []
+        for wheel in entry["wheels"]:
+            wheel_path = Path.cwd() / wheel["path"]
+            try:
+                if wheel_path.stat().st_size != wheel["size"]:
+                    return None
+            except FileNotFoundError:
+                return None
+            wheels.append(wheel_path)
+
+        return wheels if wheels else None
+
+    def store(self, builder: Builder, wheels: list[Path]):
+        """Record the wheels produced by a build.
+
+        :param builder: The builder for the build.
+        :param wheels: The wheels that were produced by the build.
+        """
+        if not wheels:
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry_path = self.path / f"{self.key(builder)}.json"
+        partial_path = entry_path.with_suffix(".part")
+        with partial_path.open("w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "package": builder.package.name,
+                    "version": builder.package.version,
+                    "tag": builder.cross_venv.tag,
+                    "wheels": [
+                        {
+                            "path": str(wheel.relative_to(Path.cwd())),
+                            "size": wheel.stat().st_size,
+                        }
+                        for wheel in wheels
+                    ],
+                },
+                f,
+                indent=4,
+            )
+        partial_path.replace(entry_path)
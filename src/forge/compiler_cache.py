@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from forge import subprocess
+from forge.logger import log
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# The compiler caches that are supported.
+TOOLS = ["ccache", "sccache"]
+
+# The name of the compiler cache used to wrap compilers, or None if compilers
+# aren't wrapped.
+tool = None
+
+# The full path to the compiler cache executable. Build environments use a minimal
+# PATH, so the tool can't be found by name.
+tool_path = None
+
+
+def configure(name: str | None):
+    """Select the compiler cache to use for builds.
+
+    :param name: The name of the compiler cache (one of ``TOOLS``), or ``None`` to
+        disable compiler caching.
+    :raises: ``RuntimeError`` if the compiler cache can't be found.
+    """
+    global tool, tool_path
+    if name is None:
+        tool = tool_path = None
+        return
+
+    path = shutil.which(name)
+    if path is None:
+        raise RuntimeError(f"Can't find compiler cache {name!r} on the PATH.")
+    tool = name
+    tool_path = path
+
+
+def cache_path() -> Path:
+    """The location of the compiler cache, shared by all cross environments."""
+    return Path.cwd() / "cache" / "compiler" / tool
+
+
+def stats_log_path(builder: Builder) -> Path:
+    """The location where ccache logs the results of each compilation of a build."""
+    return builder.build_path / "ccache-stats.log"
+
+
+def wrap(compiler: str) -> str:
+    """Wrap a compiler command so it uses the compiler cache.
+
+    :param compiler: The compiler command (e.g., the ``CC`` sysconfig variable).
+    """
+    return f"{tool_path} {compiler}" if tool else compiler
+
+
+def compile_env(builder: Builder) -> dict[str, str]:
+    """The environment variables that configure the compiler cache for a build.
+
+    The target triple and SDK root are added to the cache key, so objects can't be
+    shared between targets whose compiler command lines happen to be identical.
+
+    :param builder: The builder for the build.
+    """
+    cross_venv = builder.cross_venv
+    cache_buster = f"{cross_venv.platform_triplet}:{cross_venv.sdk_root}"
+
+    if tool == "ccache":
+        return {
+            "CCACHE_DIR": str(cache_path()),
+            # Paths inside the build folder are hashed as relative paths, so that
+            # builds in different folders can share results.
+            "CCACHE_BASEDIR": str(builder.build_path),
+            "CCACHE_NAMESPACE": cache_buster,
+            "CCACHE_STATSLOG": str(stats_log_path(builder)),
+        }
+    elif tool == "sccache":
+        return {
+            "SCCACHE_DIR": str(cache_path()),
+            "SCCACHE_C_CUSTOM_CACHE_BUSTER": cache_buster,
+        }
+    return {}
+
+
+def _sccache_counts() -> Counter:
+    output = subprocess.check_output(
+        [tool_path, "--show-stats", "--stats-format=json"],
+        env={**os.environ, "SCCACHE_DIR": str(cache_path())},
+        encoding="UTF-8",
+    )
+    stats = json.loads(output)["stats"]
+    return Counter(
+        hits=sum(stats["cache_hits"]["counts"].values()),
+        misses=sum(stats["cache_misses"]["counts"].values()),
+    )
+
+
+@contextmanager
+def stats(builder: Builder):
+    """Log the compiler cache hits and misses of the build run in the context.
+
+    :param builder: The builder for the build.
+    """
+    if tool is None:
+        yield
+        return
+
+    if tool == "ccache":
+        stats_log_path(builder).unlink(missing_ok=True)
+    else:
+        try:
+            before = _sccache_counts()
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError):
+            before = None
+
+    try:
+        yield
+    finally:
+        if tool == "ccache":
+            # The stats log has a line for each counter that was incremented by each
+            # compilation, plus a comment line naming the source file.
+            try:
+                with stats_log_path(builder).open(encoding="utf-8") as f:
+                    counters = Counter(
+                        line.strip()
+                        for line in f
+                        if line.strip() and not line.startswith("#")
+                    )
+            except FileNotFoundError:
+                counters = Counter()
+            counts = Counter(
+                hits=sum(n for name, n in counters.items() if name.endswith("_hit")),
+                misses=counters["cache_miss"],
+            )
+            detail = ""
+        else:
+            try:
+                counts = _sccache_counts() - before
+            except (
+                OSError,
+                TypeError,
+                subprocess.CalledProcessError,
+                ValueError,
+                KeyError,
+            ):
+                counts = None
+            # The sccache server is shared by all builds.
+            detail = " (including any concurrent builds)"
+
+        if counts is None:
+            log(builder.log_file, f"\nCompiler cache ({tool}): statistics unavailable")
+        else:
+            log(
+                builder.log_file,
+                f"\nCompiler cache ({tool}): {counts['hits']} hits, "
+                f"{counts['misses']} misses{detail}",
+            )
@@ -2,13 +2,37 @@ from __future__ import annotations
 
 import argparse
 import itertools
+import json
 import os
 import shutil
 import sys
 import sysconfig
+import threading
+import time
+from collections import defaultdict
+from importlib.metadata import version as package_version
 from pathlib import Path
 
 from forge import subprocess
+from forge.logger import log
+from forge.wheelhouse import Wheelhouse
+
+# A script that describes a Python interpreter in the cross environment. Everything
+# forge needs to know about an interpreter is collected in a single launch, and
+# output as JSON.
+PROBE_SCRIPT = """
+import json, sys, sysconfig
+json.dump(
+    {
+        "platform": sysconfig.get_platform(),
+        "version": sys.version.split(" ")[0],
+        "path": sys.path,
+        "config_vars": sysconfig.get_config_vars(),
+    },
+    sys.stdout,
+    default=str,
+)
+"""
 
 
 class CrossVEnv:
@@ -63,6 +87,19 @@ class CrossVEnv:
         ("watchos", "arm64_32"): "watchos-arm64_32",
     }
 
+    # Pip is pinned to 24.3.1, the last release in 2024. This project is
+    # entirely to support historical builds, on historical Python versions;
+    # as such, we're isolating ourself from drift in tools over time.
+    PIP_VERSION = "24.3.1"
+
+    # The Python interpreters in a cross environment.
+    PYTHON_FLAVORS = ["python", "build-python", "cross-python"]
+
+    # Template environments can be shared by concurrent builds; only one build
+    # can create (or recreate) a given template at a time.
+    _template_locks = defaultdict(threading.Lock)
+    _template_locks_lock = threading.Lock()
+
     def __init__(self, sdk, sdk_version, arch):
         self.sdk = sdk
         self.sdk_version = sdk_version
@@ -77,6 +114,7 @@ class CrossVEnv:
         self.platform_triplet = f"{self.arch}-{self.PLATFORM_TRIPLET[sdk]}"
 
         # Prime the on-demand variable cache
+        self._probe = None
         self._sysconfig_data = None
         self._install_root = None
         self._sdk_root = None
@@ -84,6 +122,25 @@ class CrossVEnv:
     def __str__(self):
         return self.venv_name
 
+    @property
+    def host_python(self) -> Path:
+        """The host Python binary used by the cross environment."""
+        return self.host_python_home / f"bin/python3.{sys.version_info.minor}"
+
+    @property
+    def host_sysconfig(self) -> Path:
+        """The sysconfig data file for the host Python."""
+        return (
+            self.host_python_home
+            / f"lib/python3.{sys.version_info.minor}"
+            / f"_sysconfigdata__{self.host_os.lower()}_{self.arch}-{self.sdk}.py"
+        )
+
+    @property
+    def template_path(self) -> Path:
+        """The location of the template environment for this cross environment."""
+        return Path.cwd() / "venvs" / self.venv_name
+
     def exists(self) -> bool:
         """Does the cross environment exist?"""
         return self.venv_path.is_dir()
@@ -106,25 +163,69 @@ class CrossVEnv:
             raise RuntimeError("Cross environment hasn't been created.")
         return self.location / self.venv_name
 
+    @property
+    def created_path(self) -> Path:
+        """The location of the stamp recording when the environment was created."""
+        return self.venv_path / "forge-created"
+
+    @property
+    def probe_path(self) -> Path:
+        """The location of the cached description of the environment's interpreters."""
+        return self.venv_path / "forge-probe.json"
+
+    def probe(self) -> dict[str, dict]:
+        """Describe each of the Python interpreters in the cross environment.
+
+        Each interpreter is launched once to run ``PROBE_SCRIPT``. The result is cached
+        next to the environment, keyed by the descriptor that is recorded when the
+        environment is created, the stamp recording when it was created, and the
+        location of the environment; so an environment (or a clone of a template
+        environment) is only probed once, and an environment that has been recreated
+        in the same location is probed again.
+
+        :returns: A dictionary describing each interpreter, keyed by the name of the
+            interpreter (``python``, ``build-python`` or ``cross-python``).
+        """
+        if self._probe is None:
+            try:
+                created = self.created_path.read_text(encoding="utf-8").strip()
+            except FileNotFoundError:
+                created = None
+            key = {
+                "stamp": self.template_descriptor(),
+                "created": created,
+                "location": str(self.venv_path),
+            }
+            try:
+                with self.probe_path.open(encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached["key"] == key:
+                    self._probe = cached["flavors"]
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+            if self._probe is None:
+                self._probe = {
+                    flavor: json.loads(
+                        self.check_output(
+                            [flavor, "-c", PROBE_SCRIPT], encoding="UTF-8"
+                        )
+                    )
+                    for flavor in self.PYTHON_FLAVORS
+                }
+
+                partial_path = self.probe_path.with_suffix(".part")
+                with partial_path.open("w", encoding="utf-8") as f:
+                    json.dump({"key": key, "flavors": self._probe}, f, indent=4)
+                partial_path.replace(self.probe_path)
+
+        return self._probe
+
     @property
     def sysconfig_data(self) -> dict[str, str]:
         """The sysconfig data for the cross environment."""
         if self._sysconfig_data is None:
-            # Run a script in the cross-venv that outputs the config variables
-            config_var_repr = self.check_output(
-                [
-                    "python",
-                    "-c",
-                    "import sysconfig; print(sysconfig.get_config_vars())",
-                ],
-                encoding="UTF-8",
-            )
-
-            # Parse the output of the previous command as Python,
-            # turning it back into a dict.
-            config = {}
-            exec(f"data = {config_var_repr}", config, config)
-            self._sysconfig_data = config["data"]
+            self._sysconfig_data = self.probe()["python"]["config_vars"]
 
         return self._sysconfig_data
 
@@ -136,16 +237,9 @@ class CrossVEnv:
         that native libraries can be installed as wheels.
         """
         if self._install_root is None:
-            # Run a script to get the last element of the cross-venv's sys.path.
-            # This should be the site-packages folder of the cross environment.
-            cross_site_packages = self.check_output(
-                [
-                    "python",
-                    "-c",
-                    "import sys; print(sys.path[-1])",
-                ],
-                encoding="UTF-8",
-            ).strip()
+            # The last element of the cross-venv's sys.path should be the
+            # site-packages folder of the cross environment.
+            cross_site_packages = self.probe()["python"]["path"][-1]
             self._install_root = Path(cross_site_packages) / "opt"
             if self.venv_path not in self._install_root.parents:
                 raise RuntimeError(
@@ -209,27 +303,28 @@ class CrossVEnv:
         :raises: ``RuntimeError`` if an environment matching the requested host already
             exists, and ``clean=False``.
         """
-        host_python = self.host_python_home / f"bin/python3.{sys.version_info.minor}"
+        host_python = self.host_python
         if not host_python.is_file():
             raise RuntimeError(f"Can't find host python {host_python}")
 
-        host_sysconfig = (
-            self.host_python_home
-            / f"lib/python3.{sys.version_info.minor}"
-            / f"_sysconfigdata__{self.host_os.lower()}_{self.arch}-{self.sdk}.py"
-        )
+        host_sysconfig = self.host_sysconfig
         if not host_sysconfig.is_file():
             raise RuntimeError(f"Can't find host sysconfig {host_sysconfig}")
 
         self.location = Path(location).resolve() if location else Path.cwd()
         if self.exists():
             if clean:
-                print(f"Removing old {self} environment...")
+                log(None, f"Removing old {self} environment...")
                 shutil.rmtree(self.venv_path)
             else:
                 raise RuntimeError(f"Environment {self} already exists.")
 
-        print(f"Creating {self}...")
+        # Any previously discovered details refer to the old environment.
+        self._probe = None
+        self._sysconfig_data = None
+        self._install_root = None
+
+        log(None, f"Creating {self}...")
         try:
             subprocess.run(
                 None,  # Creating the cross venv isn't logged.
@@ -249,17 +344,17 @@ class CrossVEnv:
                 f"Unable to create cross platform environment {self}."
             ) from e
 
-        print("Verifying cross-platform environment...")
+        # Clones of a template share its stamp, as they share its probe.
+        self.created_path.write_text(f"{time.time_ns()}\n", encoding="utf-8")
+
+        log(None, "Verifying cross-platform environment...")
         self.verify()
-        print("done.")
-        print()
-        print(f"Cross platform environment {self} created.")
-
-        print()
-        print("Updating cross-pip...")
-        # Pip is pinned to 24.3.1, the last release in 2024. This project is
-        # entirely to support historical builds, on historical Python versions;
-        # as such, we're isolating ourself from drift in tools over time.
+        log(None, "done.")
+        log(None)
+        log(None, f"Cross platform environment {self} created.")
+
+        log(None)
+        log(None, "Updating cross-pip...")
         self.run(
             None,
             [
@@ -269,12 +364,12 @@ class CrossVEnv:
                 "install",
                 "--disable-pip-version-check",
                 "--upgrade",
-                "pip==24.3.1",
+                f"pip=={self.PIP_VERSION}",
             ],
         )
 
-        print()
-        print("Updating build-pip...")
+        log(None)
+        log(None, "Updating build-pip...")
         self.run(
             None,
             [
@@ -284,77 +379,170 @@ class CrossVEnv:
                 "install",
                 "--disable-pip-version-check",
                 "--upgrade",
-                "pip==24.3.1",
+                f"pip=={self.PIP_VERSION}",
             ],
         )
 
-    def verify(self):
-        # python returns the cross-platform host tag.
-        output = self.check_output(
-            ["python", "-c", "import sysconfig; print(sysconfig.get_platform())"],
-            encoding="UTF-8",
-        ).strip()
-        if output != self.platform_identifier:
-            raise RuntimeError(
-                f"Cross platform python should be {self.platform_identifier}; "
-                f"got {output}"
-            )
+    def template_descriptor(self) -> dict:
+        """Describe the inputs used to create a template environment.
 
-        # python is the same version as the local python
-        local_python_version = sys.version.split(" ")[0]
-        python_version = self.check_output(
-            ["python", "-c", "import sys; print(sys.version.split(' ')[0])"],
-            encoding="UTF-8",
-        ).strip()
-        if python_version != local_python_version:
-            raise RuntimeError(
-                f"Cross platform python should be {local_python_version!r}; "
-                f"got {python_version!r}"
-            )
+        If any of these inputs change, the template must be recreated.
+        """
+        return {
+            "host_python": str(self.host_python),
+            "host_sysconfig": str(self.host_sysconfig),
+            "host_sysconfig_mtime": self.host_sysconfig.stat().st_mtime,
+            "python": sys.version,
+            "crossenv": package_version("crossenv"),
+            "pip": self.PIP_VERSION,
+        }
+
+    def clone(self, location=None, clean=False):
+        """Create a cross compilation virtual environment by copying a template.
+
+        The template environment is stored in the ``venvs`` folder of the current
+        working directory. It is created (using ``create()``) the first time it is
+        needed, and recreated if any of the inputs used to create it have changed.
+
+        Files in the template are hard linked into the new environment where possible.
+        Pip removes a file before writing a replacement, so installing packages into the
+        new environment doesn't modify the template. Text files that refer to the
+        location of the template are copied, with the location updated.
 
-        # build-python returns the build environment tag.
-        output = self.check_output(
-            ["build-python", "-c", "import sysconfig; print(sysconfig.get_platform())"],
-            encoding="UTF-8",
-        ).strip()
-        if output != sysconfig.get_platform():
-            raise RuntimeError(
-                f"Cross platform build-python should be {sysconfig.get_platform()}; "
-                f"got {output}"
-            )
+        :param location: The location in which to create the cross env. Defaults to the
+            current working directory.
+        :param clean: Should a pre-existing environment matching the same descriptor
+            be removed and recreated?
+        :raises: ``RuntimeError`` if an environment matching the requested host already
+            exists, and ``clean=False``.
+        """
+        with self._template_locks_lock:
+            template_lock = self._template_locks[self.template_path]
+
+        with template_lock:
+            stamp_path = self.template_path / "forge-template.json"
+            try:
+                with stamp_path.open(encoding="utf-8") as f:
+                    current = json.load(f) == self.template_descriptor()
+            except (FileNotFoundError, ValueError):
+                current = False
+
+            if not current:
+                log(None, f"Creating template {self} environment...")
+                self.create(location=self.template_path.parent, clean=True)
+                with stamp_path.open("w", encoding="utf-8") as f:
+                    json.dump(self.template_descriptor(), f, indent=4)
 
-        # build-python is the same version as the local python
-        build_python_version = self.check_output(
-            ["build-python", "-c", "import sys; print(sys.version.split(' ')[0])"],
-            encoding="UTF-8",
-        ).strip()
-        if build_python_version != local_python_version:
-            raise RuntimeError(
-                f"Cross platform build-python should be {local_python_version}; "
-                f"got {build_python_version}"
-            )
+        self.location = Path(location).resolve() if location else Path.cwd()
+        if self.exists():
+            if clean:
+                log(None, f"Removing old {self} environment...")
+                shutil.rmtree(self.venv_path)
+            else:
+                raise RuntimeError(f"Environment {self} already exists.")
 
-        # cross-python returns the cross-platform host tag.
-        output = self.check_output(
-            ["cross-python", "-c", "import sysconfig; print(sysconfig.get_platform())"],
-            encoding="UTF-8",
-        ).strip()
-        if output != self.platform_identifier:
-            raise RuntimeError(
-                f"Cross platform cross-python should be {self.platform_identifier}; "
-                f"got {output}"
-            )
+        log(None, f"Cloning {self} from template...")
+        self._clone_tree(self.template_path, self.venv_path)
 
-        # cross-python is the same version as the local python
-        cross_python_version = self.check_output(
-            ["cross-python", "-c", "import sys; print(sys.version.split(' ')[0])"],
-            encoding="UTF-8",
-        ).strip()
-        if cross_python_version != local_python_version:
-            raise RuntimeError(
-                f"Cross platform python should be {local_python_version}; "
-                f"got {cross_python_version}"
-            )
+        # Any previously discovered paths refer to the old location. The cached probe
+        # of the template has been copied into the clone, with its paths updated.
+        self._probe = None
+        self._sysconfig_data = None
+        self._install_root = None
+
+    def reuse(self, location):
+        """Use a cross compilation virtual environment that already exists.
+
+        :param location: The location in which the cross env was created.
+        :raises: ``RuntimeError`` if the environment doesn't exist.
+        """
+        self.location = Path(location).resolve()
+        if not self.exists():
+            raise RuntimeError(f"Environment {self} doesn't exist.")
+
+        self._probe = None
+        self._sysconfig_data = None
+        self._install_root = None
+
+    def copy_build_environment(self, source: CrossVEnv):
+        """Replace the build environment with a copy of another environment's.
+
+        The build environment (used by ``build-python`` and ``build-pip``) runs on
+        the build machine, so it is the same for every platform. Once the build tools
+        for a package have been installed in one platform's environment, the other
+        platforms can copy them, rather than installing them again.
+
+        :param source: The cross environment whose build environment will be copied.
+            It must be for the same Python version.
+        """
+        target_path = self.venv_path / "build"
+        shutil.rmtree(target_path)
+        self._clone_tree(
+            source.venv_path / "build",
+            target_path,
+            old_root=source.venv_path,
+            new_root=self.venv_path,
+        )
+
+    def _clone_tree(self, source: Path, target: Path, old_root=None, new_root=None):
+        # References to the old root (by default, the source) are updated to refer to
+        # the new root (by default, the target).
+        old_prefix = os.fsencode(old_root or source)
+        new_prefix = os.fsencode(new_root or target)
+        for dirpath, dirnames, filenames in os.walk(source):
+            target_dir = target / Path(dirpath).relative_to(source)
+            target_dir.mkdir(parents=True, exist_ok=True)
+
+            # os.walk lists symlinks to directories as directories, but doesn't
+            # descend into them.
+            for name in dirnames + filenames:
+                source_path = Path(dirpath) / name
+                target_path = target_dir / name
+                if source_path.is_symlink():
+                    link = os.fsencode(os.readlink(source_path))
+                    os.symlink(
+                        os.fsdecode(link.replace(old_prefix, new_prefix)), target_path
+                    )
+                elif name in filenames:
+                    content = source_path.read_bytes()
+                    # Compiled bytecode and binaries can't be rewritten, but the
+                    # stale paths they may contain are only used for diagnostics.
+                    if (
+                        old_prefix in content
+                        and b"\0" not in content
+                        and source_path.suffix != ".pyc"
+                    ):
+                        target_path.write_bytes(content.replace(old_prefix, new_prefix))
+                        shutil.copymode(source_path, target_path)
+                    else:
+                        try:
+                            os.link(source_path, target_path)
+                        except OSError:
+                            shutil.copy2(source_path, target_path)
+
+    def verify(self):
+        probe = self.probe()
+        local_python_version = sys.version.split(" ")[0]
+
+        # python and cross-python return the cross-platform host tag; build-python
+        # returns the build environment tag.
+        for flavor, platform in [
+            ("python", self.platform_identifier),
+            ("build-python", sysconfig.get_platform()),
+            ("cross-python", self.platform_identifier),
+        ]:
+            if probe[flavor]["platform"] != platform:
+                raise RuntimeError(
+                    f"Cross platform {flavor} should be {platform}; "
+                    f"got {probe[flavor]['platform']}"
+                )
+
+            # All the interpreters are the same version as the local python
+            if probe[flavor]["version"] != local_python_version:
+                raise RuntimeError(
+                    f"Cross platform {flavor} should be {local_python_version!r}; "
+                    f"got {probe[flavor]['version']!r}"
+                )
 
     def cross_kwargs(self, kwargs):
         venv_kwargs = kwargs.copy()
@@ -425,20 +613,26 @@ class CrossVEnv:
     ):
         """Install packages into the cross environment.
 
+        Packages are installed from the local wheel paths, and from the wheelhouse for
+        the environment; the wheelhouse is filled with any wheels that are needed, the
+        first time a given set of packages is installed.
+
         :param packages: The list of package names/specifiers to install.
         :param update: Should the package be updated ("-U")
         :param build: Should the package be installed in the build environment? Defaults
             to installing in the host environment.
         :param paths: The paths to search for additional wheels ("--find-links").
         """
-        # build-pip is a script; pip is a shim with a hashbang that points
-        # at a python interpreter, which we can't invoke with subprocess.
+        wheelhouse = Wheelhouse(self, build=build)
+        wheelhouse.fill(logfile, packages, paths=paths)
+
         self.run(
             logfile,
-            (["build-pip"] if build else ["python", "-m", "pip"])
+            self.pip_command(build=build)
             + [
                 "install",
                 "--disable-pip-version-check",
+                "--no-index",
             ]
             # If we're doing a host build, require binary packages.
             # build environment can use non-binary packages.
@@ -452,16 +646,29 @@ class CrossVEnv:
             )
             # Update packages if requested
             + (["-U"] if update else [])
-            # Include the local wheels paths if provided.
-            + (
-                list(itertools.chain(*(["--find-links", str(path)] for path in paths)))
-                if paths
-                else []
+            # Include the local wheels paths if provided, then the wheelhouse.
+            + list(
+                itertools.chain(
+                    *(
+                        ["--find-links", str(path)]
+                        for path in (paths or []) + [wheelhouse.path]
+                    )
+                )
             )
             # Finally, the list of packages to install.
             + packages,
         )
 
+    def pip_command(self, build=False) -> list[str]:
+        """The command used to invoke pip in the cross environment.
+
+        :param build: Should the pip for the build environment be used? Defaults to
+            the pip for the host environment.
+        """
+        # build-pip is a script; pip is a shim with a hashbang that points
+        # at a python interpreter, which we can't invoke with subprocess.
+        return ["build-pip"] if build else ["python", "-m", "pip"]
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -500,8 +707,8 @@ def main():
         )
         cross_venv.create(clean=args.clean)
     except RuntimeError as e:
-        print()
-        print(f"ERROR: {e}")
+        log(None)
+        log(None, f"ERROR: {e}")
         sys.exit(1)
 
 
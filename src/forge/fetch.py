@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.error import URLError
+from urllib.parse import urlsplit
+
+import httpx
+
+from forge import report
+from forge.cache import file_digest
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# The download manifest can be updated by concurrent downloads.
+_manifest_lock = threading.Lock()
+
+
+def download(url: str, path: Path, client=None, progress=None, sha256=None) -> int:
+    """Download a file.
+
+    The content is written to a ``.part`` file alongside the final location, which is
+    renamed once the download is complete. If a ``.part`` file already exists (e.g.,
+    from an interrupted download), the download is resumed using an HTTP Range request.
+
+    If an expected digest is provided, the content is hashed as it is received, and
+    the download is discarded if the digest doesn't match.
+
+    :param url: The URL to download.
+    :param path: The final location of the downloaded file.
+    :param client: The ``httpx.Client`` to use. Defaults to a new connection.
+    :param progress: An optional callable that will be invoked with the size of each
+        chunk of content as it is received.
+    :param sha256: The expected sha256 hex digest of the file, if known.
+    :returns: The number of bytes that were downloaded.
+    :raises: ``RuntimeError`` if the downloaded file doesn't match the expected digest.
+    """
+    if client is None:
+        client = httpx
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_name(f"{path.name}.part")
+
+    downloaded = 0
+    try:
+        offset = partial_path.stat().st_size
+    except FileNotFoundError:
+        offset = 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    digest = hashlib.sha256()
+    with client.stream("GET", url, headers=headers, follow_redirects=True) as response:
+        if offset and response.status_code == 416:
+            # The partial file can't be resumed; start again.
+            partial_path.unlink()
+            return download(url, path, client=client, progress=progress, sha256=sha256)
+
+        response.raise_for_status()
+        # If the server doesn't support range requests, it will return the full
+        # content, so the partial file must be discarded.
+        if response.status_code == 206:
+            mode = "ab"
+            with partial_path.open("rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+        else:
+            mode = "wb"
+
+        with partial_path.open(mode) as f:
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+                digest.update(chunk)
+                downloaded += len(chunk)
+                report.record_download(len(chunk))
+                if progress:
+                    progress(len(chunk))
+
+    if sha256 and digest.hexdigest() != sha256:
+        partial_path.unlink()
+        raise RuntimeError(
+            f"Download of {url} has sha256 {digest.hexdigest()}; expected {sha256}."
+        )
+
+    partial_path.replace(path)
+    return downloaded
+
+
+class DownloadStore:
+    """The store of downloaded source archives.
+
+    Archives are stored once for each distinct content, in a content-addressed
+    ``blobs`` folder; each named archive in the ``downloads`` folder is a hard link to
+    its blob. A manifest records the digest, size and modification time of each named
+    archive, so a later run can trust an archive without hashing it again.
+    """
+
+    @property
+    def path(self) -> Path:
+        return Path.cwd() / "downloads"
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / "manifest.json"
+
+    def blob_path(self, sha256: str) -> Path:
+        """The location of the blob for a given digest."""
+        return self.path / "blobs" / "sha256" / sha256[:2] / sha256
+
+    def _load_manifest(self) -> dict[str, dict]:
+        try:
+            with self.manifest_path.open(encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _record(self, path: Path, sha256: str):
+        stat = path.stat()
+        with _manifest_lock:
+            manifest = self._load_manifest()
+            manifest[str(path.relative_to(self.path))] = {
+                "sha256": sha256,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+            }
+            partial_path = self.manifest_path.with_suffix(".part")
+            with partial_path.open("w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=4)
+            partial_path.replace(self.manifest_path)
+
+    def _recorded_digest(self, path: Path) -> str | None:
+        # The digest recorded for the file, if the file hasn't changed since.
+        try:
+            entry = self._load_manifest()[str(path.relative_to(self.path))]
+            stat = path.stat()
+        except (KeyError, FileNotFoundError):
+            return None
+
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        return None
+
+    def digest(self, path: Path) -> str:
+        """The sha256 digest of an archive in the store.
+
+        The digest recorded in the manifest is used if the archive hasn't changed;
+        otherwise, the archive is hashed, and the manifest is updated.
+
+        :param path: The archive.
+        """
+        sha256 = self._recorded_digest(path)
+        if sha256 is None:
+            sha256 = file_digest(path)
+            self._record(path, sha256)
+        return sha256
+
+    def is_valid(self, path: Path, sha256: str | None = None) -> bool:
+        """Can an archive in the store be used?
+
+        An archive that doesn't match its expected digest is deleted.
+
+        :param path: The archive.
+        :param sha256: The expected sha256 digest of the archive, if known.
+        :returns: True if the archive exists, and matches the expected digest.
+        """
+        if not path.is_file():
+            return False
+
+        if sha256 and self.digest(path) != sha256:
+            # The archive may have been corrupted in place; if so, the blob it is
+            # linked to has been corrupted as well.
+            blob_path = self.blob_path(sha256)
+            try:
+                if path.samefile(blob_path):
+                    blob_path.unlink()
+            except FileNotFoundError:
+                pass
+            path.unlink()
+            return False
+
+        return True
+
+    def fetch(self, url: str, path: Path, sha256=None, client=None, progress=None):
+        """Download an archive into the store.
+
+        :param url: The URL to download.
+        :param path: The named location of the archive in the store.
+        :param sha256: The expected sha256 hex digest of the archive, if known.
+        :param client: The ``httpx.Client`` to use. Defaults to a new connection.
+        :param progress: An optional callable that will be invoked with the size of
+            each chunk of content as it is received.
+        :returns: The number of bytes that were downloaded.
+        """
+        size = download(url, path, client=client, progress=progress, sha256=sha256)
+        if sha256 is None:
+            sha256 = file_digest(path)
+
+        # If identical content has already been downloaded under a different name,
+        # replace the new download with a link to the existing blob. The new download
+        # has been verified; if the existing blob doesn't match it, the blob is
+        # replaced with the download instead.
+        blob_path = self.blob_path(sha256)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if blob_path.is_file() and file_digest(blob_path) == sha256:
+                linked_path = path.with_name(f"{path.name}.link")
+                os.link(blob_path, linked_path)
+                linked_path.replace(path)
+            else:
+                linked_path = blob_path.with_name(f"{blob_path.name}.link")
+                linked_path.unlink(missing_ok=True)
+                os.link(path, linked_path)
+                linked_path.replace(blob_path)
+        except OSError:
+            # The filesystem doesn't support hard links; keep a separate copy.
+            pass
+
+        self._record(path, sha256)
+        return size
+
+
+def prefetch(builders: list[Builder], connections=8, connections_per_host=4):
+    """Download the source archives needed by a collection of builds.
+
+    Archives are downloaded concurrently, through a shared connection pool. Archives
+    that have already been downloaded are skipped. Any download that fails is
+    reported, but isn't fatal; the build will try to download the archive again.
+
+    :param builders: The builders whose sources should be downloaded.
+    :param connections: The maximum number of concurrent downloads.
+    :param connections_per_host: The maximum number of concurrent downloads from
+        any single host.
+    """
+    store = DownloadStore()
+    downloads = {}
+    for builder in builders:
+        try:
+            url = builder.download_source_url()
+            path = builder.source_archive_path
+            sha256 = builder.source_sha256()
+        except (RuntimeError, URLError):
+            # The build doesn't have a source archive to download, or the package
+            # index can't be reached to identify it; the build will report the
+            # problem.
+            continue
+
+        if path not in downloads and not store.is_valid(path, sha256):
+            downloads[path] = (url, sha256)
+
+    if not downloads:
+        return
+
+    print()
+    print(f"Downloading {len(downloads)} source archives...")
+    host_limits = {
+        urlsplit(url).hostname: threading.Semaphore(connections_per_host)
+        for url, _ in downloads.values()
+    }
+
+    def fetch(client, url, path, sha256):
+        with host_limits[urlsplit(url).hostname]:
+            return store.fetch(url, path, sha256=sha256, client=client)
+
+    limits = httpx.Limits(max_connections=connections)
+    with httpx.Client(limits=limits, timeout=httpx.Timeout(30)) as client:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = {
+                executor.submit(fetch, client, url, path, sha256): path
+                for path, (url, sha256) in downloads.items()
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    size = future.result()
+                    print(f" * {path.name} ({size} bytes)")
+                except Exception as e:
+                    print(f" * {path.name} failed: {e}")
+    print()
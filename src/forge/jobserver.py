@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+
+
+class JobServer:
+    """A pool of job tokens, compatible with the GNU make jobserver protocol.
+
+    The pool is a pipe holding one byte for each job that can run. A client reads a
+    byte before starting a job, and writes it back when the job is complete. Any
+    ``make`` run with ``MAKEFLAGS`` that name the pipe (and that inherits the pipe's
+    file descriptors) takes its parallel jobs from the pool, so the total number of
+    jobs across all the clients stays within the budget.
+
+    Under the protocol, each ``make`` may run one job without taking a token; that
+    job is covered by the token forge takes for the build that runs ``make``.
+    """
+
+    def __init__(self, jobs: int):
+        """
+        :param jobs: The total number of jobs that can run at the same time.
+        """
+        if jobs < 1:
+            raise ValueError("At least one job must be allowed.")
+        self.jobs = jobs
+        self.read_fd, self.write_fd = os.pipe()
+        os.write(self.write_fd, b"+" * jobs)
+
+    @property
+    def fds(self) -> tuple[int, int]:
+        """The file descriptors that must be passed to clients of the jobserver."""
+        return (self.read_fd, self.write_fd)
+
+    @property
+    def makeflags(self) -> str:
+        # --jobserver-fds is understood by every version of GNU make, including the
+        # 3.81 release that is shipped with macOS.
+        return f"-j --jobserver-fds={self.read_fd},{self.write_fd}"
+
+    def acquire(self) -> bytes:
+        """Take a token from the pool, waiting until one is available."""
+        return os.read(self.read_fd, 1)
+
+    def release(self, token: bytes):
+        """Return a token to the pool."""
+        os.write(self.write_fd, token)
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+# The jobserver shared by all builds, or None if builds aren't coordinated.
+server = None
+
+
+def start(jobs: int):
+    """Start the jobserver shared by all builds.
+
+    :param jobs: The total number of compiler jobs that can run at the same time.
+    """
+    global server
+    server = JobServer(jobs)
+
+
+def stop():
+    global server
+    if server:
+        server.close()
+        server = None
+
+
+@contextmanager
+def token():
+    """Hold a token from the jobserver for the duration of the context."""
+    if server is None:
+        yield
+        return
+
+    job_token = server.acquire()
+    try:
+        yield
+    finally:
+        server.release(job_token)
+
+
+def budget() -> int:
+    """The total number of compiler jobs that can run at the same time.
+
+    This is the size of the jobserver's pool if it has been started; otherwise, the
+    number of CPUs.
+    """
+    return server.jobs if server else (os.cpu_count() or 1)
+
+
+def compile_env() -> dict[str, str]:
+    """The environment variables that make a build a client of the jobserver."""
+    return {"MAKEFLAGS": server.makeflags} if server else {}
+
+
+def fds() -> tuple[int, ...]:
+    """The file descriptors that must be passed to a build for it to use the
+    jobserver."""
+    return server.fds if server else ()
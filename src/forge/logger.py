@@ -1,28 +1,276 @@
+from __future__ import annotations
+
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
 import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+from forge import report
 
 verbose = False
 
+# If True, each line on the console is prefixed with the build that produced it. This
+# is useful when several builds are running at the same time.
+console_prefix = False
+
+
+class Record:
+    """A single item of log output."""
+
+    __slots__ = [
+        "timestamp",
+        "level",
+        "build",
+        "phase",
+        "args",
+        "sep",
+        "end",
+        "console",
+        "log_file",
+    ]
+
+    def __init__(self, level, log_file, args, sep=" ", end="\n", console=True):
+        self.timestamp = time.time()
+        self.level = level
+        self.build = getattr(log_file, "build", None)
+        self.phase = report.current_phase_name()
+        self.args = args
+        self.sep = sep
+        self.end = end
+        self.console = console
+        self.log_file = log_file
+
+    @property
+    def text(self) -> str:
+        # Records are formatted by the writer thread, not the thread that logs them.
+        return self.sep.join(str(arg) for arg in self.args) + self.end
+
+    def as_dict(self) -> dict:
+        return {
+            "time": self.timestamp,
+            "level": self.level,
+            "build": self.build,
+            "phase": self.phase,
+            "message": self.text.rstrip("\n"),
+        }
+
+
+class ConsoleSink:
+    """Write log records to the console."""
+
+    def __init__(self):
+        self._partial = None
+
+    def emit(self, record: Record):
+        if not record.console:
+            return
+
+        stream = sys.stderr if record.level == "error" else sys.stdout
+        text = record.text
+        if console_prefix and record.build:
+            # Finish a partial line from another build before starting a new one.
+            if self._partial not in {None, record.build}:
+                stream.write("\n")
+            prefix = f"[{record.build}] "
+            lines = text.split("\n")
+            if self._partial is None:
+                lines[0] = prefix + lines[0]
+            text = "\n".join(
+                [lines[0]] + [prefix + line if line else line for line in lines[1:]]
+            )
+            self._partial = None if text.endswith("\n") else record.build
+        stream.write(text)
+
+    def flush(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    def close(self):
+        self.flush()
+
+
+class JSONLSink:
+    """Write every log record, including debug records, to a JSON lines file."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = path.open("a", encoding="utf-8")
+
+    def emit(self, record: Record):
+        self.file.write(json.dumps(record.as_dict()) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class BuildLog:
+    """The log file for a single build."""
+
+    def __init__(self, path: Path, build: str):
+        """
+        :param path: The location of the log file.
+        :param build: The identifier of the build, included in each record.
+        """
+        self.path = path
+        self.build = build
+        self.file = path.open("w", encoding="utf-8")
+
+    def emit(self, record: Record):
+        self.file.write(record.text)
+
+    def write(self, text: str):
+        """Write text directly to the log."""
+        _emit(Record("info", self, [text], end="", console=False))
+
+    def close(self):
+        flush()
+        self.file.close()
+
+
+# The sinks that receive every record; each build's log also receives the records
+# for that build.
+sinks = [ConsoleSink()]
+
+# Records are written by a background thread, in the order they were logged.
+_queue = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _write(record: Record):
+    for sink in sinks:
+        if record.level != "debug" or isinstance(sink, JSONLSink) or verbose:
+            sink.emit(record)
+
+    if isinstance(record.log_file, BuildLog):
+        record.log_file.emit(record)
+    elif record.log_file:
+        # Any other file-like object.
+        record.log_file.write(record.text)
+
+
+def _run_writer():
+    while True:
+        # Write everything that is waiting before flushing the sinks.
+        items = [_queue.get()]
+        try:
+            while len(items) < 1000:
+                items.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        for item in items:
+            if isinstance(item, threading.Event):
+                for sink in sinks:
+                    sink.flush()
+                item.set()
+            else:
+                try:
+                    _write(item)
+                except Exception:
+                    traceback.print_exc()
+
+        for sink in sinks:
+            sink.flush()
+
+
+def _emit(record: Record):
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_run_writer, daemon=True)
+                _writer.start()
+    _queue.put(record)
+
+
+def flush():
+    """Wait until every record logged so far has been written."""
+    if _writer is None:
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait()
+
+
+atexit.register(flush)
+
+
+def add_sink(sink):
+    """Add a sink that will receive every log record."""
+    flush()
+    sinks.append(sink)
+
+
+@contextmanager
+def open_build_log(path: Path, build: str):
+    """Open the log file for a build.
+
+    :param path: The location of the log file.
+    :param build: The identifier of the build.
+    :returns: A context manager providing the ``BuildLog``. All records for the
+        build have been written when the context exits.
+    """
+    build_log = BuildLog(path, build)
+    try:
+        yield build_log
+    finally:
+        build_log.close()
+
 
 def log(log_file, *args, debug=False, **kwargs):
     """Log output to the screen, and to the log file.
 
-    :param log_file: An open file handle to write log content to
+    :param log_file: The ``BuildLog`` (or other open file handle) to write log
+        content to.
     :param args: The arguments to pass to print
     :param debug: Is the output debug-specific? Debug output is only output to the log
         file.
     :param kwargs: Additional keyword arguments to pass to print.
     """
-    if verbose or not debug:
-        print(*args, **kwargs)
-    if log_file:
-        print(*args, **kwargs, file=log_file)
+    # Debug output that has nowhere to go isn't recorded at all.
+    if debug and not (verbose or log_file or len(sinks) > 1):
+        return
+
+    _emit(
+        Record(
+            "debug" if debug else "info",
+            log_file,
+            args,
+            sep=kwargs.get("sep", " "),
+            end=kwargs.get("end", "\n"),
+        )
+    )
+
+
+def log_lines(log_file, lines, console=True):
+    """Log a batch of lines of output to the screen, and to the log file.
+
+    The lines are written as a single record, rather than one record per line.
+
+    :param log_file: The ``BuildLog`` (or other open file handle) to write log
+        content to.
+    :param lines: The lines to output, without trailing newlines.
+    :param console: Should the lines be output to the screen?
+    """
+    if not lines:
+        return
+
+    _emit(Record("info", log_file, ["\n".join(lines)], console=console))
 
 
 def log_exception(log_file):
     """Log the current exception stack tracce to the screen, and to the log file.
 
-    :param log_file: An open file handle to write log content to
+    :param log_file: The ``BuildLog`` (or other open file handle) to write log
+        content to.
     """
-    traceback.print_exc()
-    if log_file:
-        traceback.print_exc(file=log_file)
+    _emit(Record("error", log_file, [traceback.format_exc()], end=""))
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import shutil
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# The compression formats that can be used for archived logs.
+COMPRESSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# Should the logs of finished builds be archived?
+enabled = True
+
+# The compression format used for archived logs.
+compression = "gzip"
+
+# The number of archived logs to keep for each package, platform and Python version.
+keep = 5
+
+# Archived logs can be added to the index from any build thread.
+_lock = threading.Lock()
+
+
+def configure(name: str):
+    """Select the compression format for archived logs.
+
+    :param name: The name of the compression format (one of ``COMPRESSIONS``).
+    :raises: ``RuntimeError`` if the format isn't available.
+    """
+    global compression
+    if name == "zstd" and zstandard is None:
+        raise RuntimeError(
+            "zstd compression requires the zstandard package; "
+            "install it with `pip install zstandard`."
+        )
+    compression = name
+
+
+def archive_path() -> Path:
+    """The location of the archived logs."""
+    return Path.cwd() / "logs" / "archive"
+
+
+def index_path() -> Path:
+    """The location of the index of archived logs."""
+    return Path.cwd() / "logs" / "index.jsonl"
+
+
+@contextmanager
+def _compressed_writer(path: Path, format: str):
+    with path.open("wb") as f:
+        if format == "zstd":
+            with zstandard.ZstdCompressor().stream_writer(f, closefd=False) as out:
+                yield out
+        else:
+            # The original filename and time aren't needed in the archive.
+            with gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as out:
+                yield out
+
+
+def open_log(path: Path):
+    """Open an archived log for reading.
+
+    :param path: The location of the archived log.
+    :returns: A text stream of the decompressed log.
+    """
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path.name} requires the zstandard package.")
+        # The file is closed when the decompressed stream is closed.
+        stream = zstandard.ZstdDecompressor().stream_reader(
+            path.open("rb"), closefd=True
+        )
+    elif path.suffix == ".gz":
+        stream = gzip.open(path, "rb")
+    else:
+        stream = path.open("rb")
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+
+
+def compress(source: Path, target: Path, format: str):
+    """Compress a log file.
+
+    :param source: The log file to compress.
+    :param target: The location of the compressed log.
+    :param format: The compression format (one of ``COMPRESSIONS``).
+    """
+    partial = target.with_name(f"{target.name}.part")
+    with source.open("rb") as f, _compressed_writer(partial, format) as out:
+        shutil.copyfileobj(f, out)
+    partial.replace(target)
+
+
+def archive(builder: Builder, log_path: Path, success: bool, cached: bool, wall: float):
+    """Compress the log of a finished build into the archive, and index it.
+
+    :param builder: The builder for the build.
+    :param log_path: The current location of the build's log.
+    :param success: Did the build succeed?
+    :param cached: Were the wheels of the build taken from the cache?
+    :param wall: The time taken by the build, in seconds.
+    :returns: The location of the archived log.
+    """
+    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+    target = (
+        archive_path()
+        / f"{builder.log_file_path.stem}-{timestamp}.log{COMPRESSIONS[compression]}"
+    )
+    target.parent.mkdir(parents=True, exist_ok=True)
+    compress(log_path, target, compression)
+
+    # The cause of a failure has already been identified from the build's output.
+    first_error = None
+    if not success and builder.diagnosis:
+        first_error = builder.diagnosis[0]
+
+    entry = {
+        "package": builder.package.name,
+        "version": builder.package.version,
+        "tag": builder.cross_venv.tag,
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "success": success,
+        "cached": cached,
+        "started": time.time() - wall,
+        "wall": round(wall, 3),
+        "first_error": first_error,
+        "path": str(target.relative_to(Path.cwd())),
+    }
+    with _lock, index_path().open("a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return target
+
+
+def read_index() -> list[dict]:
+    """Read the index of archived logs, oldest first."""
+    entries = []
+    try:
+        with index_path().open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A partially written entry.
+                    pass
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def prune(count: int | None = None) -> int:
+    """Remove all but the newest archived logs of each package, platform and Python
+    version.
+
+    :param count: The number of logs to keep for each package, platform and Python
+        version. Defaults to ``keep``.
+    :returns: The number of logs that were removed.
+    """
+    count = keep if count is None else count
+    with _lock:
+        groups = defaultdict(list)
+        for entry in read_index():
+            groups[(entry["package"], entry["tag"], entry["python"])].append(entry)
+
+        kept = []
+        removed = 0
+        for entries in groups.values():
+            entries.sort(key=lambda entry: entry["started"])
+            for entry in entries[: max(0, len(entries) - count)]:
+                (Path.cwd() / entry["path"]).unlink(missing_ok=True)
+                removed += 1
+            kept.extend(entries[max(0, len(entries) - count) :])
+
+        if removed:
+            kept.sort(key=lambda entry: entry["started"])
+            partial = index_path().with_suffix(".part")
+            with partial.open("w", encoding="utf-8") as f:
+                for entry in kept:
+                    f.write(json.dumps(entry) + "\n")
+            partial.replace(index_path())
+
+    return removed
+
+
+def query(
+    package: str | None = None,
+    version: str | None = None,
+    tag: str | None = None,
+    python: str | None = None,
+    failed: bool = False,
+) -> list[dict]:
+    """Find archived logs in the index.
+
+    :param package: Only include logs for this package.
+    :param version: Only include logs for this version.
+    :param tag: Only include logs for platform tags that contain this text.
+    :param python: Only include logs for this Python version (e.g., "3.11").
+    :param failed: Only include logs of failed builds.
+    :returns: The matching index entries, newest first.
+    """
+    entries = [
+        entry
+        for entry in read_index()
+        if (package is None or entry["package"] == package)
+        and (version is None or entry["version"] == version)
+        and (tag is None or tag in entry["tag"])
+        and (python is None or entry["python"] == python)
+        and not (failed and entry["success"])
+    ]
+    return sorted(entries, key=lambda entry: entry["started"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the logs of past builds")
+    parser.add_argument("package", nargs="?", help="Only show logs for this package.")
+    parser.add_argument("--version", help="Only show logs for this version.")
+    parser.add_argument(
+        "--tag", help="Only show logs for platform tags containing this text."
+    )
+    parser.add_argument(
+        "--python", help="Only show logs for this Python version (e.g., 3.11)."
+    )
+    parser.add_argument(
+        "--failed", action="store_true", help="Only show logs of failed builds."
+    )
+    parser.add_argument(
+        "-n",
+        "--limit",
+        type=int,
+        default=20,
+        help="The number of logs to list. Defaults to 20.",
+    )
+    parser.add_argument(
+        "--show",
+        action="store_true",
+        help="Output the content of the newest matching log.",
+    )
+    parser.add_argument(
+        "--prune",
+        type=int,
+        metavar="COUNT",
+        default=None,
+        help=(
+            "Remove all but the newest COUNT logs of each package, platform and "
+            "Python version."
+        ),
+    )
+
+    args = parser.parse_args()
+
+    if args.prune is not None:
+        print(f"Removed {prune(args.prune)} archived logs.")
+        return
+
+    entries = query(
+        package=args.package,
+        version=args.version,
+        tag=args.tag,
+        python=args.python,
+        failed=args.failed,
+    )
+    if not entries:
+        print("No matching logs.")
+        sys.exit(1)
+
+    if args.show:
+        try:
+            with open_log(Path.cwd() / entries[0]["path"]) as f:
+                shutil.copyfileobj(f, sys.stdout)
+        except (OSError, RuntimeError) as e:
+            print()
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        return
+
+    for entry in entries[: args.limit]:
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["started"]))
+        if entry["success"]:
+            result = "cached" if entry["cached"] else "success"
+        else:
+            result = "FAILED"
+        print(
+            f"{started} {entry['package']} {entry['version']} ({entry['tag']}, "
+            f"Python {entry['python']}): {result} in {entry['wall']:.1f}s"
+        )
+        if entry["first_error"]:
+            print(f"    {entry['first_error']}")
+        print(f"    {entry['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import shutil
+import struct
+import tempfile
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from packaging.utils import parse_wheel_filename
+
+from forge import subprocess
+from forge.wheel import WheelWriter
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# Mach-O magic numbers, as read from the start of a file.
+MH_MAGIC = {
+    b"\xce\xfa\xed\xfe": "<",  # 32-bit, little endian
+    b"\xcf\xfa\xed\xfe": "<",  # 64-bit, little endian
+    b"\xfe\xed\xfa\xce": ">",  # 32-bit, big endian
+    b"\xfe\xed\xfa\xcf": ">",  # 64-bit, big endian
+}
+FAT_MAGIC = 0xCAFEBABE
+AR_MAGIC = b"!<arch>\n"
+
+CPU_TYPE_ARM64 = 0x0100000C
+
+# Java class files share the fat magic number; a real fat binary has only a handful
+# of architectures.
+MAX_FAT_ARCHS = 32
+
+
+def _thin_arch(data: bytes) -> tuple[int, int] | None:
+    """The CPU type and subtype of a thin Mach-O binary, or of a static library of
+    Mach-O objects; or ``None`` if the data isn't either."""
+    endian = MH_MAGIC.get(data[:4])
+    if endian:
+        return struct.unpack(f"{endian}ii", data[4:12])
+
+    if data.startswith(AR_MAGIC):
+        # The architecture of a static library is the architecture of its objects.
+        offset = len(AR_MAGIC)
+        while offset + 60 <= len(data):
+            header = data[offset : offset + 60]
+            name = header[:16].decode("ascii", "replace").strip()
+            size = int(header[48:58].decode("ascii").strip())
+            member = data[offset + 60 : offset + 60 + size]
+            # BSD archives store long names at the start of the member data.
+            if name.startswith("#1/"):
+                member = member[int(name[3:]) :]
+            arch = _thin_arch(member) if not member.startswith(AR_MAGIC) else None
+            if arch:
+                return arch
+            offset += 60 + size + (size % 2)
+
+    return None
+
+
+def fat_slices(data: bytes) -> list[tuple[int, int, bytes]] | None:
+    """Split a Mach-O binary into architecture slices.
+
+    :param data: The content of the binary.
+    :returns: A list of (CPU type, CPU subtype, content) for each architecture in the
+        binary; or ``None`` if the data isn't a Mach-O binary or static library.
+    """
+    if len(data) >= 8:
+        magic, count = struct.unpack(">II", data[:8])
+        if magic == FAT_MAGIC and 0 < count <= MAX_FAT_ARCHS:
+            slices = []
+            for index in range(count):
+                cputype, cpusubtype, offset, size, _ = struct.unpack(
+                    ">iiIII", data[8 + index * 20 : 28 + index * 20]
+                )
+                slices.append((cputype, cpusubtype, data[offset : offset + size]))
+            return slices
+
+    arch = _thin_arch(data)
+    if arch is None:
+        return None
+    return [(*arch, data)]
+
+
+def is_mach_o(data: bytes) -> bool:
+    """Is the data a Mach-O binary (thin or fat), or a static library of Mach-O
+    objects?"""
+    return fat_slices(data) is not None
+
+
+class PythonMergeMachO:
+    """Merge Mach-O binaries by writing a fat binary in pure Python.
+
+    This works on any platform, so merging can be tested without Apple's tools.
+    """
+
+    def merge(self, sources: list[Path], target: Path):
+        """Merge thin (or fat) Mach-O binaries into a single fat binary.
+
+        :param sources: The binaries to merge.
+        :param target: The location of the merged binary.
+        :raises: ``RuntimeError`` if a source isn't a Mach-O binary, or if more than
+            one source provides the same architecture.
+        """
+        slices = {}
+        for source in sources:
+            source_slices = fat_slices(source.read_bytes())
+            if source_slices is None:
+                raise RuntimeError(f"{source} isn't a Mach-O binary.")
+            for cputype, cpusubtype, content in source_slices:
+                if (cputype, cpusubtype) in slices:
+                    raise RuntimeError(
+                        f"{source} duplicates an architecture in another binary."
+                    )
+                slices[(cputype, cpusubtype)] = content
+
+        # The header is followed by the content of each slice, aligned to a page
+        # boundary of the slice's architecture.
+        header = struct.pack(">II", FAT_MAGIC, len(slices))
+        offset = len(header) + 20 * len(slices)
+        arch_headers = []
+        layout = []
+        for (cputype, cpusubtype), content in sorted(slices.items()):
+            align = 14 if cputype == CPU_TYPE_ARM64 else 12
+            offset = (offset + (1 << align) - 1) & ~((1 << align) - 1)
+            arch_headers.append(
+                struct.pack(">iiIII", cputype, cpusubtype, offset, len(content), align)
+            )
+            layout.append((offset, content))
+            offset += len(content)
+
+        with target.open("wb") as f:
+            f.write(header)
+            for arch_header in arch_headers:
+                f.write(arch_header)
+            for slice_offset, content in layout:
+                f.write(b"\0" * (slice_offset - f.tell()))
+                f.write(content)
+
+
+class LipoMergeMachO:
+    """Merge Mach-O binaries using Apple's ``lipo``."""
+
+    def merge(self, sources: list[Path], target: Path):
+        subprocess.check_output(
+            ["lipo", "-create", "-output", str(target)] + [str(s) for s in sources],
+            stderr=subprocess.STDOUT,
+        )
+
+
+# The available Mach-O mergers.
+MERGERS = {
+    "python": PythonMergeMachO,
+    "lipo": LipoMergeMachO,
+}
+
+
+def get_merger(name: str | None = None):
+    """Get a Mach-O merger.
+
+    :param name: The name of the merger, from ``MERGERS``. If ``None``, ``lipo`` is
+        used if it is available.
+    """
+    if name is None:
+        name = "lipo" if shutil.which("lipo") else "python"
+    return MERGERS[name]()
+
+
+def merged_wheel_name(wheels: list[Path]) -> str:
+    """The filename of a wheel that combines the tags of several wheels.
+
+    :param wheels: The wheels that will be merged. They must be for the same version
+        of the same package.
+    """
+    tags = set()
+    for wheel in wheels:
+        tags.update(parse_wheel_filename(wheel.name)[3])
+
+    # The name, version and build tag are kept in their original form.
+    parts = wheels[0].name[: -len(".whl")].split("-")[:-3]
+    for values in [
+        {tag.interpreter for tag in tags},
+        {tag.abi for tag in tags},
+        {tag.platform for tag in tags},
+    ]:
+        parts.append(".".join(sorted(values)))
+    return "-".join(parts) + ".whl"
+
+
+def merge_wheels(
+    wheels: list[Path], target_dir: Path, merger: str | None = None
+) -> Path:
+    """Merge the wheels for several architectures into a single wheel.
+
+    Mach-O binaries (including static libraries) that appear in more than one wheel
+    are merged into a fat binary; files that only appear in one wheel are copied.
+    The merged wheel is tagged with all the tags of the source wheels.
+
+    :param wheels: The wheels to merge.
+    :param target_dir: The folder in which to write the merged wheel.
+    :param merger: The name of the Mach-O merger to use. Defaults to ``lipo`` if it
+        is available.
+    :returns: The path of the merged wheel.
+    :raises: ``RuntimeError`` if a wheel doesn't contain a ``WHEEL`` file, or if the
+        wheels contain different versions of a file that can't be merged.
+    """
+    target = target_dir / merged_wheel_name(wheels)
+    mach_o_merger = get_merger(merger)
+
+    contents = defaultdict(list)
+    tags = set()
+    for wheel in wheels:
+        wheel_file = None
+        with zipfile.ZipFile(wheel) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                name = info.filename
+                if name.endswith(".dist-info/RECORD"):
+                    continue
+                content = zf.read(info)
+                if name.endswith(".dist-info/WHEEL"):
+                    wheel_file = (name, content)
+                    tags.update(
+                        line.split(":", 1)[1].strip()
+                        for line in content.decode("utf-8").splitlines()
+                        if line.startswith("Tag:")
+                    )
+                    continue
+                contents[name].append((content, info.external_attr))
+
+        if wheel_file is None:
+            raise RuntimeError(f"{wheel.name} doesn't contain a .dist-info/WHEEL file.")
+
+    dist_info = wheel_file[0].rsplit("/", 1)[0]
+
+    # The WHEEL file lists every tag of the merged wheel.
+    lines = [
+        line
+        for line in wheel_file[1].decode("utf-8").splitlines()
+        if line and not line.startswith("Tag:")
+    ]
+    lines.extend(f"Tag: {tag}" for tag in sorted(tags))
+    files = {f"{dist_info}/WHEEL": (("\n".join(lines) + "\n").encode("utf-8"), None)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for index, (name, versions) in enumerate(sorted(contents.items())):
+            distinct = {content for content, _ in versions}
+            if len(distinct) == 1:
+                files[name] = versions[0]
+            elif all(is_mach_o(content) for content in distinct):
+                sources = []
+                for source_index, content in enumerate(distinct):
+                    source = Path(tmp) / f"{index}-{source_index}"
+                    source.write_bytes(content)
+                    sources.append(source)
+                merged = Path(tmp) / f"{index}-merged"
+                mach_o_merger.merge(sources, merged)
+                files[name] = (merged.read_bytes(), versions[0][1])
+            else:
+                raise RuntimeError(
+                    f"Can't merge {name}; it differs between {wheels[0].name} and "
+                    "the other wheels."
+                )
+
+        # The content of the .dist-info folder is written last.
+        with WheelWriter(target, dist_info) as writer:
+            for name, (content, external_attr) in sorted(
+                files.items(), key=lambda item: (item[0].startswith(dist_info), item[0])
+            ):
+                mode = (external_attr >> 16) if external_attr else 0o644
+                writer.write_bytes(name, content, mode=mode)
+
+    return target
+
+
+def merge_slices(builders: list[Builder], merger: str | None = None) -> list[Path]:
+    """Merge the wheels produced for the architectures of each SDK.
+
+    For example, the iphonesimulator arm64 and x86_64 wheels of a package are merged
+    into a single wheel, tagged for both architectures. Wheels that aren't specific
+    to a platform aren't merged.
+
+    The merged wheels are written to the ``merged`` folder, rather than next to the
+    wheels for each architecture, so that they aren't mistaken for the output of a
+    build (or used as the requirements of another build).
+
+    :param builders: The builders for the platforms of a single package version.
+    :param merger: The name of the Mach-O merger to use. Defaults to ``lipo`` if it
+        is available.
+    :returns: The paths of the merged wheels.
+    """
+    groups = defaultdict(list)
+    for builder in builders:
+        if builder.wheels:
+            cross_venv = builder.cross_venv
+            groups[(cross_venv.sdk, cross_venv.sdk_version)].append(builder)
+
+    merged = []
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+
+        # Match the wheels produced for each architecture by project and version.
+        wheels = defaultdict(list)
+        for builder in group:
+            for wheel in builder.wheels:
+                name, version, _, tags = parse_wheel_filename(wheel.name)
+                if any(tag.platform == builder.cross_venv.tag for tag in tags):
+                    wheels[(name, version)].append(wheel)
+
+        for arch_wheels in wheels.values():
+            if len(arch_wheels) == len(group):
+                merged.append(
+                    merge_wheels(arch_wheels, Path.cwd() / "merged", merger=merger)
+                )
+
+    return merged
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import sys
 from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
 
 import jinja2
@@ -16,60 +17,77 @@ from forge.build import (
 )
 from forge.cross import CrossVEnv
 
+# Rendered and validated metadata, keyed by recipe, recipe content, version, build
+# number and Python version.
+_meta_cache = {}
 
-class Package:
-    def __init__(
-        self, package_name_or_recipe: str, version: str | None, build_number: str | None
-    ):
-        if "/" in package_name_or_recipe:
-            self.recipe_path = Path(package_name_or_recipe)
-        else:
-            self.recipe_path = Path.cwd() / "recipes" / package_name_or_recipe
 
-        if not (self.recipe_path / "meta.yaml").exists():
-            raise ValueError(
-                f"{package_name_or_recipe} does not appear to be a valid recipe."
+@lru_cache
+def meta_validator():
+    """The validator for recipe metadata.
+
+    The schema is loaded and checked once per process. The validator fills in the
+    default value of any property that isn't provided.
+    """
+
+    # http://python-jsonschema.readthedocs.io/en/latest/faq/
+    def with_defaults(validator_cls):
+        def set_defaults(validator, properties, instance, schema):
+            for name, subschema in properties.items():
+                if "default" in subschema:
+                    instance.setdefault(name, deepcopy(subschema["default"]))
+            yield from validator_cls.VALIDATORS["properties"](
+                validator, properties, instance, schema
             )
 
-        self.meta = self.load_meta(
-            override_version=version, override_build=build_number
-        )
+        return jsonschema.validators.extend(validator_cls, {"properties": set_defaults})
 
-        # Extract some useful properties from the metadata
-        self.name = self.meta["package"]["name"]
-        self.version = self.meta["package"]["version"]
+    # Validate the meta-schema
+    Validator = jsonschema.Draft4Validator
+    with (Path(__file__).parent / "schema" / "meta-schema.yaml").open(
+        encoding="utf-8"
+    ) as f:
+        schema = yaml.safe_load(f)
+    Validator.check_schema(schema)
 
-    def __str__(self):
-        return f"{self.name} {self.version}"
+    return with_defaults(Validator)(schema)
 
-    def load_meta(self, override_version, override_build):
-        # http://python-jsonschema.readthedocs.io/en/latest/faq/
-        def with_defaults(validator_cls):
-            def set_defaults(validator, properties, instance, schema):
-                for name, subschema in properties.items():
-                    if "default" in subschema:
-                        instance.setdefault(name, deepcopy(subschema["default"]))
-                yield from validator_cls.VALIDATORS["properties"](
-                    validator, properties, instance, schema
-                )
-
-            return jsonschema.validators.extend(
-                validator_cls, {"properties": set_defaults}
-            )
 
-        # Validate the meta-schema
-        Validator = jsonschema.Draft4Validator
-        with (Path(__file__).parent / "schema" / "meta-schema.yaml").open(
-            encoding="utf-8"
-        ) as f:
-            schema = yaml.safe_load(f)
-        Validator.check_schema(schema)
+@lru_cache
+def meta_template(meta_path: Path, stamp: tuple[int, int]) -> jinja2.Template:
+    """The compiled template for a recipe's metadata.
+
+    :param meta_path: The path to the ``meta.yaml`` file of the recipe.
+    :param stamp: The modification time and size of the file. A new template is
+        compiled whenever the file changes.
+    """
+    with meta_path.open(encoding="utf-8") as f:
+        return jinja2.Template(f.read())
 
-        with (self.recipe_path / "meta.yaml").open(encoding="utf-8") as f:
-            meta_template = f.read()
 
+def load_meta(recipe_path: Path, override_version=None, override_build=None) -> dict:
+    """Load the metadata for a recipe.
+
+    The rendered and validated metadata is cached for each version and build number;
+    each call returns a new copy that can be safely modified.
+
+    :param recipe_path: The path to the recipe folder.
+    :param override_version: The version to build, or ``None`` for the version
+        specified by the recipe.
+    :param override_build: The build number to use, or ``None`` for the build number
+        specified by the recipe.
+    :returns: The metadata for the recipe.
+    """
+    meta_path = (recipe_path / "meta.yaml").resolve()
+    stat = meta_path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    key = (meta_path, stamp, override_version, override_build, sys.version_info[:2])
+    try:
+        meta = _meta_cache[key]
+    except KeyError:
         # Render the meta template.
-        meta_str = jinja2.Template(meta_template).render(
+        meta_str = meta_template(meta_path, stamp).render(
             version=(
                 tuple(int(v) for v in override_version.split("."))
                 if override_version
@@ -95,9 +113,62 @@ class Package:
                 pass
 
         # Validate the metadata against the schema.
-        with_defaults(Validator)(schema).validate(meta)
+        meta_validator().validate(meta)
+
+        _meta_cache[key] = meta
+
+    return deepcopy(meta)
+
+
+def load_recipes(recipes_path: Path | None = None) -> dict[str, Package]:
+    """Load the default version of every recipe in a folder.
 
-        return meta
+    :param recipes_path: The folder containing the recipes. Defaults to the
+        ``recipes`` folder in the current working directory.
+    :returns: A dictionary of packages, keyed by the name of the recipe folder.
+    """
+    if recipes_path is None:
+        recipes_path = Path.cwd() / "recipes"
+
+    return {
+        meta_path.parent.name: Package(
+            str(meta_path.parent), version=None, build_number=None
+        )
+        for meta_path in sorted(recipes_path.glob("*/meta.yaml"))
+    }
+
+
+class Package:
+    def __init__(
+        self, package_name_or_recipe: str, version: str | None, build_number: str | None
+    ):
+        if "/" in package_name_or_recipe:
+            self.recipe_path = Path(package_name_or_recipe)
+        else:
+            self.recipe_path = Path.cwd() / "recipes" / package_name_or_recipe
+
+        if not (self.recipe_path / "meta.yaml").exists():
+            raise ValueError(
+                f"{package_name_or_recipe} does not appear to be a valid recipe."
+            )
+
+        self.meta = self.load_meta(
+            override_version=version, override_build=build_number
+        )
+
+        # Extract some useful properties from the metadata
+        self.name = self.meta["package"]["name"]
+        self.version = self.meta["package"]["version"]
+
+    def __str__(self):
+        return f"{self.name} {self.version}"
+
+    def load_meta(self, override_version, override_build):
+        return load_meta(
+            self.recipe_path,
+            override_version=override_version,
+            override_build=override_build,
+        )
 
     def builder(self, cross_venv: CrossVEnv) -> Builder:
         """Return a builder for this package in the given cross-platform environment.
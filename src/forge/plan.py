@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import heapq
+
+from packaging.utils import canonicalize_name, canonicalize_version
+
+from forge.scheduler import BuildJob
+
+
+def parse_requirement(requirement: str) -> tuple[str, str | None]:
+    """Split a recipe requirement into a package name and an optional version.
+
+    :param requirement: A requirement from the ``requirements`` section of a recipe,
+        in the form ``<package>`` or ``<package> <version>``.
+    :returns: A tuple of the canonical package name, and the canonical version (or
+        ``None`` if the requirement doesn't specify a version).
+    """
+    parts = requirement.split()
+    try:
+        version = canonicalize_version(parts[1])
+    except IndexError:
+        version = None
+    return canonicalize_name(parts[0]), version
+
+
+class BuildPlan:
+    """A dependency graph of build jobs.
+
+    The graph is derived from the ``host`` and ``build`` requirements of each job's
+    recipe metadata. A job depends on every other job in the plan that builds one of
+    its requirements; if the requirement specifies a version, only jobs building that
+    version will satisfy it. Requirements that aren't built by any job in the plan are
+    assumed to be available from ``dist``, ``deps`` or ``published``.
+    """
+
+    def __init__(self, build_jobs: list[BuildJob]):
+        """
+        :param build_jobs: The jobs in the plan, in the order they were requested.
+        :raises: ``RuntimeError`` if the requirements of the jobs contain a cycle.
+        """
+        for job in build_jobs:
+            requirements = [
+                parse_requirement(requirement)
+                for target in ["host", "build"]
+                for requirement in job.package.meta["requirements"][target]
+            ]
+            job.requires = {
+                other
+                for other in build_jobs
+                if other is not job
+                and any(
+                    canonicalize_name(other.package.name) == name
+                    and (
+                        version is None
+                        or canonicalize_version(other.package.version) == version
+                    )
+                    for name, version in requirements
+                )
+            }
+
+        self.build_jobs = self._topological_order(build_jobs)
+
+    def _topological_order(self, build_jobs):
+        # Kahn's algorithm; where there is a choice, jobs are taken in the order they
+        # were requested, so the order of independent jobs is preserved.
+        index = {job: i for i, job in enumerate(build_jobs)}
+        waiting = {job: len(job.requires) for job in build_jobs}
+        dependents = {job: [] for job in build_jobs}
+        for job in build_jobs:
+            for requirement in job.requires:
+                dependents[requirement].append(job)
+
+        ready = [index[job] for job, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+
+        ordered = []
+        while ready:
+            job = build_jobs[heapq.heappop(ready)]
+            ordered.append(job)
+            for dependent in dependents[job]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    heapq.heappush(ready, index[dependent])
+
+        if len(ordered) != len(build_jobs):
+            raise RuntimeError(
+                "Build requirements contain a cycle between "
+                + ", ".join(str(job) for job in build_jobs if job not in ordered)
+            )
+
+        return ordered
+
+    def critical_path(self) -> list[BuildJob]:
+        """The longest chain of dependent jobs in the plan.
+
+        The length of a chain is measured in builds, since every job runs one build
+        for each of its platforms in sequence.
+
+        :returns: The jobs on the critical path, in build order.
+        """
+        finish = {}
+        previous = {}
+        for job in self.build_jobs:
+            previous[job] = max(job.requires, key=finish.get, default=None)
+            finish[job] = len(job.cross_venvs) + (
+                finish[previous[job]] if previous[job] else 0
+            )
+
+        path = []
+        job = max(self.build_jobs, key=finish.get, default=None)
+        while job:
+            path.append(job)
+            job = previous[job]
+        return path[::-1]
+
+    def show(self):
+        """Print the build graph and its critical path."""
+        builds = sum(len(job.cross_venvs) for job in self.build_jobs)
+        print()
+        print(f"Build plan ({len(self.build_jobs)} jobs, {builds} builds):")
+        for job in self.build_jobs:
+            print(f" * {job} ({len(job.cross_venvs)} builds)")
+            if job.requires:
+                requires = sorted(str(requirement) for requirement in job.requires)
+                print(f"     requires: {', '.join(requires)}")
+
+        critical_path = self.critical_path()
+        length = sum(len(job.cross_venvs) for job in critical_path)
+        print()
+        print(f"Critical path ({length} builds):")
+        print(f"   {' -> '.join(str(job) for job in critical_path)}")
+        print()
@@ -1,22 +1,129 @@
 import datetime
 import json
+import os
 import ssl
 import sys
+import time
 from functools import lru_cache
-from urllib.request import urlopen
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
 
 import certifi
+from packaging.utils import canonicalize_name
 
 START_YEAR = datetime.datetime.now().year - 3
 
+# The root of the PyPI JSON API. This can be overridden to use a local stand-in.
+PYPI_URL = os.environ.get("MOBILE_FORGE_PYPI_URL", "https://pypi.org/pypi")
+
+# The number of seconds cached metadata can be used before it must be revalidated.
+CACHE_TTL = 24 * 60 * 60
+
+# The version of the format of the cached metadata. Cached metadata in any other
+# format will be discarded.
+CACHE_FORMAT = 2
+
+# If True, only cached metadata will be used.
+offline = False
+
+
+def pypi_cache_path(package_name):
+    """The location of the cached metadata for a package.
+
+    :param package_name: The PyPI name of the package.
+    """
+    return Path.cwd() / "cache" / "pypi" / f"{canonicalize_name(package_name)}.json"
+
+
+def compact_releases(releases):
+    """Reduce a PyPI release list to the fields that forge uses.
+
+    :param releases: The ``releases`` dictionary from the PyPI JSON API.
+    :returns: A dictionary with the same structure, containing only the fields that
+        are needed to select versions and source URLs.
+    """
+    return {
+        version: [
+            {
+                "packagetype": package["packagetype"],
+                "filename": package["filename"],
+                "upload_time": package["upload_time"],
+                "python_version": package["python_version"],
+                "yanked": package["yanked"],
+                "url": package["url"],
+                "sha256": package["digests"].get("sha256"),
+            }
+            for package in release
+        ]
+        for version, release in releases.items()
+    }
+
 
 @lru_cache
 def get_pypi_releases(package_name):
-    url = f"https://pypi.org/pypi/{package_name}/json"
+    """Get the releases of a package on PyPI.
+
+    Metadata is cached on disk. Cached metadata is used without any network access
+    until it is older than ``CACHE_TTL``; it is then revalidated using the ETag and
+    Last-Modified values returned when it was fetched. If forge is offline, cached
+    metadata is always used.
+
+    :param package_name: The PyPI name of the package to query.
+    :raises: ``RuntimeError`` if forge is offline, and there is no cached metadata.
+    """
+    cache_path = pypi_cache_path(package_name)
+    try:
+        with cache_path.open(encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["format"] != CACHE_FORMAT:
+            cached = None
+    except (FileNotFoundError, ValueError, KeyError):
+        cached = None
+
+    if cached and (offline or time.time() - cached["fetched"] < CACHE_TTL):
+        return cached["releases"]
+
+    if offline:
+        raise RuntimeError(f"No cached PyPI metadata for {package_name}.")
+
+    request = Request(f"{PYPI_URL}/{package_name}/json")
+    if cached:
+        if cached["etag"]:
+            request.add_header("If-None-Match", cached["etag"])
+        if cached["last_modified"]:
+            request.add_header("If-Modified-Since", cached["last_modified"])
 
     # ensure we're using a root certificate that works with PyPI
     context = ssl.create_default_context(cafile=certifi.where())
-    releases = json.load(urlopen(url, context=context))["releases"]
+    try:
+        with urlopen(request, context=context) as response:
+            releases = compact_releases(json.load(response)["releases"])
+            headers = response.headers
+    except HTTPError as e:
+        # A 304 response means the cached metadata is still current.
+        if cached and e.code == 304:
+            releases = cached["releases"]
+            headers = e.headers
+        else:
+            raise
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = cache_path.with_suffix(".part")
+    with partial_path.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "format": CACHE_FORMAT,
+                "fetched": time.time(),
+                "etag": headers.get("ETag") or (cached and cached["etag"]),
+                "last_modified": (
+                    headers.get("Last-Modified") or (cached and cached["last_modified"])
+                ),
+                "releases": releases,
+            },
+            f,
+        )
+    partial_path.replace(cache_path)
 
     return releases
 
@@ -65,3 +172,22 @@ def get_pypi_source_urls(package_name):
                 urls[version] = package["url"]
 
     return urls
+
+
+@lru_cache
+def get_pypi_source_digests(package_name):
+    """Get the sha256 digests of the source distributions for a PyPI package.
+
+    :param name: The PyPI name of the package to query.
+    :returns: a dictionary of sha256 hex digests for all non-yanked source
+        distributions for the project, keyed by version number.
+    """
+    releases = get_pypi_releases(package_name)
+
+    digests = {}
+    for version, release in releases.items():
+        for package in release:
+            if package["packagetype"] == "sdist" and not package["yanked"]:
+                digests[version] = package["sha256"]
+
+    return digests
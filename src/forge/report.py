@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# The build being run on each thread.
+_current = threading.local()
+
+# Records can be added from any build thread.
+_lock = threading.Lock()
+
+# The records of every build in this run.
+builds = []
+
+# The total number of bytes downloaded in this run, including downloads that aren't
+# part of a build (e.g., prefetching).
+downloaded = 0
+
+# The time at which the run started.
+started = time.time()
+
+
+def _rss_bytes(maxrss):
+    # ru_maxrss is reported in bytes on macOS, but in kilobytes on Linux.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class PhaseRecord:
+    """The resources used by one phase of a build."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        # The CPU time used by subprocesses.
+        self.cpu_user = 0.0
+        self.cpu_system = 0.0
+        # The CPU time used by forge itself.
+        self.forge_cpu = 0.0
+        # The largest resident set size of any subprocess, in bytes.
+        self.peak_rss = 0
+        self.downloaded = 0
+        self.commands = 0
+        self.finished = False
+
+        self._started = time.perf_counter()
+        self._thread_time = time.thread_time()
+
+    def finish(self):
+        self.finished = True
+        self.wall = time.perf_counter() - self._started
+        self.forge_cpu = time.thread_time() - self._thread_time
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "wall": round(self.wall, 3),
+            "cpu_user": round(self.cpu_user, 3),
+            "cpu_system": round(self.cpu_system, 3),
+            "forge_cpu": round(self.forge_cpu, 3),
+            "peak_rss": self.peak_rss,
+            "downloaded": self.downloaded,
+            "commands": self.commands,
+        }
+
+
+class BuildRecord:
+    """The phases of a single build of a package, on one platform."""
+
+    def __init__(self, builder: Builder):
+        self.package = builder.package.name
+        self.version = builder.package.version
+        self.tag = builder.cross_venv.tag
+        self.success = None
+        self.cached = False
+        self.phases = []
+        self.wall = 0.0
+
+        self._started = time.perf_counter()
+
+    @property
+    def phase(self) -> PhaseRecord | None:
+        """The phase that is currently running."""
+        if self.phases and not self.phases[-1].finished:
+            return self.phases[-1]
+        return None
+
+    def start_phase(self, name: str):
+        """Finish the current phase, and start a new one.
+
+        :param name: The name of the new phase.
+        """
+        self.finish_phase()
+        self.phases.append(PhaseRecord(name))
+
+    def finish_phase(self):
+        if self.phase:
+            self.phase.finish()
+
+    def finish(self):
+        self.finish_phase()
+        self.wall = time.perf_counter() - self._started
+
+    def as_dict(self) -> dict:
+        return {
+            "type": "build",
+            "package": self.package,
+            "version": self.version,
+            "tag": self.tag,
+            "success": self.success,
+            "cached": self.cached,
+            "wall": round(self.wall, 3),
+            "phases": [phase.as_dict() for phase in self.phases],
+        }
+
+
+@contextmanager
+def track(builder: Builder):
+    """Record the phases of a build run on the current thread.
+
+    :param builder: The builder for the build.
+    :returns: A context manager providing the ``BuildRecord`` for the build.
+    """
+    record = BuildRecord(builder)
+    with _lock:
+        builds.append(record)
+
+    _current.record = record
+    try:
+        yield record
+    finally:
+        record.finish()
+        _current.record = None
+
+
+def start_phase(name: str):
+    """Start a new phase of the build on the current thread.
+
+    :param name: The name of the phase.
+    """
+    record = getattr(_current, "record", None)
+    if record:
+        record.start_phase(name)
+
+
+def _current_phase() -> PhaseRecord | None:
+    record = getattr(_current, "record", None)
+    return record.phase if record else None
+
+
+def current_phase_name() -> str | None:
+    """The name of the build phase running on the current thread, if any."""
+    phase = _current_phase()
+    return phase.name if phase else None
+
+
+def record_process(rusage):
+    """Record the resources used by a subprocess that has completed.
+
+    :param rusage: The resource usage of the process, as returned by ``os.wait4()``.
+    """
+    phase = _current_phase()
+    if phase:
+        phase.cpu_user += rusage.ru_utime
+        phase.cpu_system += rusage.ru_stime
+        phase.peak_rss = max(phase.peak_rss, _rss_bytes(rusage.ru_maxrss))
+        phase.commands += 1
+
+
+def record_download(size: int):
+    """Record content that has been downloaded.
+
+    :param size: The number of bytes downloaded.
+    """
+    global downloaded
+    with _lock:
+        downloaded += size
+
+    phase = _current_phase()
+    if phase:
+        phase.downloaded += size
+
+
+def summary() -> dict:
+    """A summary of the whole run."""
+    return {
+        "type": "run",
+        "started": started,
+        "wall": round(time.time() - started, 3),
+        "builds": len(builds),
+        "failures": sum(1 for record in builds if record.success is False),
+        "downloaded": downloaded,
+    }
+
+
+def write(path: Path):
+    """Write the report for the run.
+
+    If the path has a ``.jsonl`` suffix, the report is written as one JSON object per
+    line: one for each build, followed by a summary of the run. Otherwise, it is
+    written as a single JSON document containing the summary of the run, with the
+    record of each build under ``records``.
+
+    :param path: The file to which the report will be written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            for record in builds:
+                f.write(json.dumps(record.as_dict()) + "\n")
+            f.write(json.dumps(summary()) + "\n")
+        else:
+            json.dump(
+                {**summary(), "records": [record.as_dict() for record in builds]},
+                f,
+                indent=2,
+            )
+
+
+def show_slowest(count=5):
+    """Print the builds and phases of the run that took the most time.
+
+    :param count: The number of builds, and of phases, to show.
+    """
+    records = sorted(
+        (record for record in builds if not record.cached),
+        key=lambda record: record.wall,
+        reverse=True,
+    )
+    if not records:
+        return
+
+    print()
+    print("Slowest builds:")
+    for record in records[:count]:
+        print(
+            f" * {record.package} {record.version} ({record.tag}): {record.wall:.1f}s"
+        )
+
+    # Total the time spent in each phase across all builds.
+    phases = defaultdict(float)
+    for record in records:
+        for phase in record.phases:
+            phases[phase.name] += phase.wall
+
+    print()
+    print("Time spent in each build phase:")
+    for name, wall in sorted(phases.items(), key=lambda item: item[1], reverse=True)[
+        :count
+    ]:
+        print(f" * {name}: {wall:.1f}s")
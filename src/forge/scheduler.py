@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING
+
+from forge import jobserver
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+    from forge.cross import CrossVEnv
+    from forge.package import Package
+
+
+class BuildJob:
+    """The builds of a single version of a package, on one or more platforms.
+
+    All the builds in a job share a source tree, so they are run in order. The first
+    build of the job is clean; once a build has succeeded, subsequent builds reuse the
+    tree that was prepared, rather than checking out and patching the sources again.
+    Each platform keeps its compiled outputs in its own folder within the tree.
+
+    The build tools that run on the build machine are also the same for every
+    platform. They are installed by the first build that prepares an environment; the
+    builds after it copy that build environment, and don't check the build
+    requirements again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        version: str | None,
+        package: Package,
+        cross_venvs: list[CrossVEnv],
+    ):
+        """
+        :param name: The name of the build target, as requested by the user.
+        :param version: The version of the build target requested by the user, or
+            ``None`` if the default version is being built.
+        :param package: The package to build.
+        :param cross_venvs: The cross environments in which the package will be built.
+        """
+        self.name = name
+        self.version = version
+        self.package = package
+        self.cross_venvs = cross_venvs
+
+        # The jobs that must be completed before this job can start.
+        self.requires = set()
+
+        # A list of (cross_venv, success) pairs, one for each completed build.
+        self.results = []
+
+        self._builders = None
+
+    def __str__(self):
+        return str(self.package)
+
+    @property
+    def builders(self) -> list[Builder]:
+        """The builders for each platform of the job."""
+        if self._builders is None:
+            self._builders = [
+                self.package.builder(cross_venv) for cross_venv in self.cross_venvs
+            ]
+        return self._builders
+
+    def run(self):
+        first = True
+        primary = None
+        for builder in self.builders:
+            builder.primary = primary
+
+            # Each running build holds a jobserver token; this covers the job that
+            # each make (or other jobserver client) can run without taking a token.
+            with jobserver.token():
+                success = builder.build(clean=first)
+
+            # If the build was successful, subsequent passes don't need to be clean,
+            # and can use its build environment. A build that was taken from the cache
+            # didn't prepare anything, so the next build must still be clean.
+            if success and builder.prepared:
+                first = False
+                if primary is None:
+                    primary = builder
+            self.results.append((builder.cross_venv, success))
+
+
+class BuildScheduler:
+    """Run build jobs, running independent jobs concurrently.
+
+    Builds spend almost all of their time waiting on subprocesses, so the jobs are run
+    on a pool of threads. A job isn't started until all the jobs it requires have been
+    completed.
+    """
+
+    def __init__(self, jobs: int = 1):
+        """
+        :param jobs: The maximum number of build jobs to run at the same time.
+        """
+        if jobs < 1:
+            raise ValueError("At least one build job must be allowed.")
+        self.jobs = jobs
+
+    def run(self, build_jobs: list[BuildJob]):
+        """Run all the provided jobs.
+
+        Jobs are started in the order they are provided, as soon as the jobs they
+        require have been completed, and there is capacity to run them.
+
+        :param build_jobs: The jobs to run.
+        :raises: ``RuntimeError`` if the requirements of the jobs can't be satisfied.
+        """
+        pending = list(build_jobs)
+        completed = set()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                for job in list(pending):
+                    if len(running) >= self.jobs:
+                        break
+                    if job.requires <= completed:
+                        pending.remove(job)
+                        running[executor.submit(job.run)] = job
+
+                if not running:
+                    raise RuntimeError(
+                        "Unable to satisfy build requirements for "
+                        + ", ".join(str(job) for job in pending)
+                    )
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    # Re-raise any error that escaped the build.
+                    future.result()
+                    completed.add(job)
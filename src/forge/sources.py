@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from forge import subprocess
+from forge.cache import file_digest
+from forge.fetch import DownloadStore
+
+if TYPE_CHECKING:
+    from forge.build import Builder
+
+# Only one build can prepare a given pristine tree at a time.
+_locks = defaultdict(threading.Lock)
+_locks_lock = threading.Lock()
+
+
+def clone_tree(source: Path, target: Path):
+    """Copy a folder, using copy-on-write clones if the filesystem supports them.
+
+    Modification times are preserved, so build tools that compare timestamps (e.g.,
+    make) see the same tree as the original.
+
+    :param source: The folder to copy.
+    :param target: The location of the copy. Must not already exist.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if sys.platform == "darwin":
+        # -c uses clonefile(2), which is supported by APFS.
+        args = ["cp", "-c", "-R", "-p", str(source), str(target)]
+    else:
+        args = ["cp", "-R", "-p", "--reflink=auto", str(source), str(target)]
+
+    try:
+        subprocess.check_output(args, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        # Clones aren't available; fall back to a full copy.
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(source, target, symlinks=True)
+
+
+class SourceTreeCache:
+    """Source trees that have been unpacked and patched, ready to be cloned.
+
+    There is one pristine tree for each combination of package, version, source
+    archive and set of patches. A build folder is created by cloning the pristine
+    tree, rather than unpacking and patching the source archive again.
+    """
+
+    @property
+    def path(self) -> Path:
+        return Path.cwd() / "build" / "pristine"
+
+    def tree_path(self, builder: Builder) -> Path:
+        """The location of the pristine tree for a build.
+
+        :param builder: The builder for the build.
+        """
+        patches_path = builder.package.recipe_path / "patches"
+        key = json.dumps(
+            {
+                "source": DownloadStore().digest(builder.source_archive_path),
+                "strip": builder.source_strip,
+                "patches": [
+                    [patch, file_digest(patches_path / patch)]
+                    for patch in builder.package.meta["patches"]
+                ],
+            }
+        )
+        return (
+            self.path
+            / builder.package.name
+            / builder.package.version
+            / hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        )
+
+    def checkout(self, builder: Builder):
+        """Create the build folder for a build from its pristine tree.
+
+        If the pristine tree doesn't exist, it is created by unpacking and patching the
+        source archive.
+
+        :param builder: The builder for the build.
+        """
+        tree_path = self.tree_path(builder)
+        with _locks_lock:
+            lock = _locks[tree_path]
+
+        with lock:
+            if not tree_path.is_dir():
+                staging_path = tree_path.with_name(f"{tree_path.name}.tmp")
+                if staging_path.exists():
+                    shutil.rmtree(staging_path)
+
+                builder.log_phase("unpack", "Unpack sources")
+                builder.unpack_source(staging_path)
+
+                builder.log_phase("patch", "Apply patches")
+                builder.patch_source(staging_path)
+
+                staging_path.rename(tree_path)
+
+        builder.log_phase("checkout", "Check out patched sources")
+        clone_tree(tree_path, builder.build_path)
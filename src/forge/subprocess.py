@@ -1,20 +1,113 @@
 from __future__ import annotations
 
+import codecs
+import os
 import shlex
 import subprocess as stdlib_subprocess
+import threading
+import time
 
-from forge.logger import log
+from forge import report, triage
+from forge.logger import log, log_lines
 
 # Pass through check_output without logging
 check_output = stdlib_subprocess.check_output
 CalledProcessError = stdlib_subprocess.CalledProcessError
+STDOUT = stdlib_subprocess.STDOUT
+
+# The maximum number of lines of subprocess output per second that will be shown on
+# the console. Output in excess of this rate is only written to the log file. If
+# None, all output is shown; if 0, only a summary of the output is shown.
+console_rate = None
+
+# The number of seconds to wait for output to be drained after a process exits. Output
+# can remain after this if the process has left a child running that holds its
+# output pipe open.
+DRAIN_TIMEOUT = 10
+
+# The size of each read from the output of a subprocess.
+CHUNK_SIZE = 64 * 1024
+
+
+class _OutputPump:
+    """Read the output of a process on a background thread, and log it.
+
+    Output is read in large chunks, and all the complete lines in each chunk are
+    logged as a single batch.
+    """
+
+    def __init__(self, logfile, stream, analyzer=None):
+        self.logfile = logfile
+        self.stream = stream
+        self.analyzer = analyzer
+        self.lines = 0
+
+        self._window_start = time.monotonic()
+        self._window_lines = 0
+        self._suppressed = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def emit(self, lines):
+        lines = [line.strip() for line in lines]
+        self.lines += len(lines)
+        if self.analyzer:
+            self.analyzer.feed(lines)
+
+        if console_rate is None:
+            log_lines(self.logfile, lines)
+            return
+
+        # Show as many lines as the console rate allows in the current one-second
+        # window; the log file always gets every line.
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            if self._suppressed and console_rate:
+                log(None, f"... {self._suppressed} lines not shown ...")
+            self._window_start = now
+            self._window_lines = 0
+            self._suppressed = 0
+
+        shown = max(0, min(len(lines), console_rate - self._window_lines))
+        self._window_lines += shown
+        self._suppressed += len(lines) - shown
+
+        log_lines(None, lines[:shown])
+        log_lines(self.logfile, lines, console=False)
+
+    def run(self):
+        decoder = codecs.getincrementaldecoder("UTF-8")(errors="ignore")
+        pending = ""
+        try:
+            while chunk := self.stream.read1(CHUNK_SIZE):
+                lines = (pending + decoder.decode(chunk)).split("\n")
+                pending = lines.pop()
+                if lines:
+                    self.emit(lines)
+        except (OSError, ValueError):
+            # The stream was closed while being read; this only happens if the
+            # output couldn't be drained before the timeout.
+            return
+
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            self.emit([pending])
+
+    def finish(self):
+        """Wait for all output to be logged."""
+        self.thread.join(timeout=DRAIN_TIMEOUT)
+        if console_rate is not None and self._suppressed:
+            log(None, f"... {self._suppressed} lines not shown ...")
+        if console_rate == 0:
+            log(None, f"{self.lines} lines of output written to the log.")
 
 
 def run(logfile, *args, **kwargs):
     """A wrapper around subprocess.run() that logs all output.
 
-    Subprocesses will always be run in check mode, with UTF-8 text output, and stderr
-    redirected to stdout, and stdout being piped so it can be logged.
+    Subprocesses will always be run in check mode, with stderr redirected to stdout,
+    and stdout being piped so it can be logged. Output is decoded as UTF-8.
 
     :param logfile: An open file handle to which all output will be logged.
     :param args: The args to pass to subprocess.run
@@ -23,12 +116,6 @@ def run(logfile, *args, **kwargs):
     # stdout/err must be piped so the output streamer can print it.
     kwargs["stdout"] = stdlib_subprocess.PIPE
     kwargs["stderr"] = stdlib_subprocess.STDOUT
-    # use line-buffered output by default
-    kwargs["bufsize"] = 0
-    # use text mode
-    kwargs["encoding"] = "UTF-8"
-    kwargs["text"] = True
-    kwargs["errors"] = "ignore"
 
     log(logfile)
     log(logfile, f">>> {shlex.join(str(arg) for arg in args[0])}", debug=True)
@@ -36,16 +123,26 @@ def run(logfile, *args, **kwargs):
         log(logfile, f"    {key}={shlex.quote(value)}", debug=True)
     log(logfile, "-" * 80, debug=True)
 
+    # The analyzer must be found on the calling thread; the output is read on
+    # another thread.
+    analyzer = triage.current()
+    if analyzer:
+        analyzer.start_command(args[0])
+
     with stdlib_subprocess.Popen(*args, **kwargs) as process:
-        while (return_code := process.poll()) is None:
-            output = process.stdout.readline()
-            if output:
-                log(logfile, output.strip())
+        pump = _OutputPump(logfile, process.stdout, analyzer)
+        # Reap the process with wait4() so the resources it used can be reported.
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = return_code = os.waitstatus_to_exitcode(status)
+        pump.finish()
+        report.record_process(rusage)
 
         log(logfile, "-" * 80, debug=True)
         log(logfile, f"<<< Return code: {return_code}", debug=True)
 
     if return_code:
+        if analyzer:
+            analyzer.command_failed(return_code)
         raise stdlib_subprocess.CalledProcessError(return_code, args)
 
     return stdlib_subprocess.CompletedProcess(args, return_code)
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import re
+import shlex
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# The analyzer for the build being run on each thread.
+_current = threading.local()
+
+# A quick test for lines that might match one of the patterns. Most lines of build
+# output don't, so the full set of patterns is only tried on lines that pass.
+TRIGGER = re.compile(r"error|fail|not found|undefined|cannot find|no such", re.I)
+
+# The patterns that identify the cause of a failure, in order of precedence. The
+# first group of each pattern (if any) is the subject of the problem (e.g., the name
+# of a missing header).
+PATTERNS = [
+    (
+        "missing header",
+        re.compile(
+            r"fatal error: '?([^':]+\.(?:h|hpp|hh|hxx))'?(?::| file not found)",
+        ),
+    ),
+    (
+        "missing library",
+        re.compile(r"(?:library not found for|cannot find) (-l\S+)"),
+    ),
+    (
+        "missing module",
+        re.compile(r"ModuleNotFoundError: No module named '([^']+)'"),
+    ),
+    (
+        "patch rejected",
+        re.compile(
+            r"(Hunk #\d+ FAILED.*|\d+ out of \d+ hunks? FAILED.*"
+            r"|Reversed \(or previously applied\) patch detected.*)"
+        ),
+    ),
+    (
+        "linker error",
+        re.compile(
+            r"(Undefined symbols for architecture \S+|undefined reference to .*"
+            r"|ld: error: .*|linker command failed.*)"
+        ),
+    ),
+    (
+        "compiler error",
+        re.compile(r"^([^\s:]+:\d+(?::\d+)?): (?:fatal )?error: (.*)"),
+    ),
+    (
+        "error",
+        re.compile(r"(?:^|\s)error: (.*)"),
+    ),
+]
+
+# The number of distinct problems kept for each command run by a build.
+MAX_FINDINGS = 5
+
+# The number of lines of output kept, to show the context of a failure that doesn't
+# match any pattern.
+TAIL_LINES = 10
+
+
+def _shorten(text: str, length: int = 200) -> str:
+    return text if len(text) <= length else text[: length - 3] + "..."
+
+
+class Finding:
+    """A line of build output that identifies a problem."""
+
+    def __init__(
+        self,
+        category: str,
+        subject: str,
+        line: str,
+        command: str | None,
+        command_index: int,
+    ):
+        """
+        :param category: The kind of problem.
+        :param subject: The subject of the problem (e.g., the name of a missing
+            header).
+        :param line: The line of output.
+        :param command: The command that produced the output, if known.
+        :param command_index: The position of the command among the commands run by
+            the build.
+        """
+        self.category = category
+        self.subject = subject
+        self.line = line
+        self.command = command
+        self.command_index = command_index
+
+    def __str__(self):
+        return f"{self.category}: {self.line}"
+
+
+class Analyzer:
+    """Identify the cause of a build failure from the output of the build, as the
+    output is produced.
+
+    Problems are recorded for each command the build runs. Output that looks like
+    an error is common in commands that succeed (e.g., configure probes, or optional
+    extensions that fail to build), so the problems found in a command are discarded
+    once the command has succeeded. Only the first few problems of each command, and
+    the last few lines of output, are kept, so the cost of analyzing a build doesn't
+    depend on the size of its log.
+    """
+
+    def __init__(self):
+        self.findings = []
+        self.tail = deque(maxlen=TAIL_LINES)
+        self.command = None
+        self.command_index = 0
+        self.failed_command = None
+        self.exception = None
+        self._failed_index = None
+        self._command_findings = 0
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def start_command(self, args):
+        """Record the start of a command run by the build.
+
+        The previous command has completed; if it didn't fail, the problems found in
+        its output weren't fatal, and are discarded.
+
+        :param args: The arguments of the command.
+        """
+        with self._lock:
+            if self._failed_index != self.command_index:
+                self.findings = [
+                    finding
+                    for finding in self.findings
+                    if finding.command_index != self.command_index
+                ]
+            self.command = shlex.join(str(arg) for arg in args)
+            self.command_index += 1
+            self.tail.clear()
+            self._command_findings = 0
+            self._seen = set()
+
+    def command_failed(self, return_code: int):
+        """Record that the current command returned an error.
+
+        :param return_code: The return code of the command.
+        """
+        with self._lock:
+            if self.failed_command is None:
+                self.failed_command = (self.command, return_code)
+                self._failed_index = self.command_index
+
+    def feed(self, lines: list[str]):
+        """Analyze lines of output from the current command.
+
+        :param lines: The lines of output, without trailing newlines.
+        """
+        with self._lock:
+            self.tail.extend(lines)
+            if self._command_findings >= MAX_FINDINGS:
+                return
+
+            for line in lines:
+                if not TRIGGER.search(line):
+                    continue
+                for category, pattern in PATTERNS:
+                    match = pattern.search(line)
+                    if match:
+                        subject = match.group(1) if pattern.groups else line
+                        if (category, subject) not in self._seen:
+                            self._seen.add((category, subject))
+                            self.findings.append(
+                                Finding(
+                                    category,
+                                    subject,
+                                    line[:300],
+                                    self.command,
+                                    self.command_index,
+                                )
+                            )
+                            self._command_findings += 1
+                        break
+                if self._command_findings >= MAX_FINDINGS:
+                    return
+
+    @property
+    def relevant_findings(self) -> list[Finding]:
+        """The problems that are relevant to the failure.
+
+        If a command failed, these are the problems found in its output; otherwise,
+        they are the problems found in the output of the last command.
+        """
+        index = (
+            self._failed_index if self._failed_index is not None else self.command_index
+        )
+        return [finding for finding in self.findings if finding.command_index == index]
+
+    @property
+    def root_cause(self) -> Finding | None:
+        """The problem that most likely caused the build to fail.
+
+        This is the first problem of the most specific kind that was seen in the
+        output of the command that failed.
+        """
+        findings = self.relevant_findings
+        for category, _ in PATTERNS:
+            for finding in findings:
+                if finding.category == category:
+                    return finding
+        return None
+
+    def summary(self) -> list[str]:
+        """A condensed description of the cause of a failure.
+
+        :returns: The lines of the description.
+        """
+        lines = []
+        root_cause = self.root_cause
+        if root_cause:
+            lines.append(f"Root cause: {root_cause}")
+            if root_cause.command:
+                lines.append(f"  while running: {_shorten(root_cause.command)}")
+            lines.extend(
+                f"  also: {finding}"
+                for finding in self.relevant_findings
+                if finding is not root_cause
+            )
+        elif self.failed_command:
+            command, return_code = self.failed_command
+            lines.append(
+                f"Command failed with return code {return_code}: {_shorten(command)}"
+            )
+            lines.extend(f"  | {line}" for line in self.tail)
+
+        if self.exception and not self.failed_command:
+            lines.append(f"Exception: {self.exception}")
+
+        return lines
+
+
+@contextmanager
+def track():
+    """Analyze the output of the build run on the current thread.
+
+    :returns: A context manager providing the ``Analyzer`` for the build.
+    """
+    analyzer = Analyzer()
+    _current.analyzer = analyzer
+    try:
+        yield analyzer
+    finally:
+        _current.analyzer = None
+
+
+def current() -> Analyzer | None:
+    """The analyzer for the build running on the current thread, if any."""
+    return getattr(_current, "analyzer", None)
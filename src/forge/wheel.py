@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import stat
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+# The zlib compression level used for wheel content (0-9).
+compression_level = 6
+
+# Files with these suffixes are stored without compression. Compressing them again
+# costs time, and saves little or no space.
+STORED_SUFFIXES = {".a", ".bz2", ".gz", ".whl", ".xz", ".zip", ".zst"}
+
+# The size of each read when copying a file into a wheel.
+CHUNK_SIZE = 1024 * 1024
+
+# Timestamps in a wheel can't be earlier than this.
+MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def record_hash(digest: bytes) -> str:
+    """Format a sha256 digest as a RECORD hash.
+
+    :param digest: The raw digest.
+    """
+    return "sha256=" + base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def _set_compress_level(info: zipfile.ZipInfo, level: int | None):
+    # ZipFile only applies its own compression level to members that are opened by
+    # name; a ZipInfo carries its own level. The attribute became public in Python
+    # 3.13; earlier releases are fixed, so their private name won't change.
+    if sys.version_info >= (3, 13):
+        info.compress_level = level
+    else:
+        info._compresslevel = level
+
+
+def _date_time(mtime: float):
+    # SOURCE_DATE_EPOCH makes wheels reproducible.
+    mtime = int(os.environ.get("SOURCE_DATE_EPOCH", mtime))
+    return max(MIN_DATE_TIME, time.gmtime(mtime)[:6])
+
+
+class WheelWriter:
+    """Write a wheel, one file at a time.
+
+    Each file is streamed into the wheel, and hashed for the RECORD as it is written,
+    so the content of each file is only read once. The wheel is written to a
+    temporary name, and only renamed when it is complete; if the wheel can't be
+    written, no partial wheel is left behind.
+    """
+
+    def __init__(self, path: Path, dist_info: str, compresslevel: int | None = None):
+        """
+        :param path: The location of the wheel.
+        :param dist_info: The name of the ``.dist-info`` folder in the wheel.
+        :param compresslevel: The zlib compression level. Defaults to
+            ``compression_level``.
+        """
+        self.path = path
+        self.dist_info = dist_info
+        self.compresslevel = (
+            compression_level if compresslevel is None else compresslevel
+        )
+        self.records = []
+        self.partial_path = path.with_name(f"{path.name}.part")
+        self.zf = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.zf = zipfile.ZipFile(
+            self.partial_path,
+            "w",
+            zipfile.ZIP_DEFLATED,
+            compresslevel=self.compresslevel,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.zf.close()
+            self.partial_path.unlink(missing_ok=True)
+
+    def _info(self, arcname: str, mode: int, mtime: float) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(arcname, date_time=_date_time(mtime))
+        info.external_attr = (stat.S_IFREG | (mode & 0o777)) << 16
+        if Path(arcname).suffix in STORED_SUFFIXES or self.compresslevel == 0:
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+            _set_compress_level(info, self.zf.compresslevel)
+        return info
+
+    def _write(self, info: zipfile.ZipInfo, chunks):
+        # Each chunk is hashed as it is written.
+        digest = hashlib.sha256()
+        size = 0
+        with self.zf.open(info, "w", force_zip64=True) as out:
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        self.records.append((info.filename, record_hash(digest.digest()), size))
+
+    def write_file(self, arcname: str, source: Path):
+        """Add a file to the wheel.
+
+        :param arcname: The name of the file in the wheel.
+        :param source: The file to add.
+        """
+        st = source.stat()
+        info = self._info(arcname, st.st_mode, st.st_mtime)
+        with source.open("rb") as f:
+            self._write(info, iter(lambda: f.read(CHUNK_SIZE), b""))
+
+    def write_bytes(self, arcname: str, content: bytes, mode: int = 0o644):
+        """Add a file with the given content to the wheel.
+
+        :param arcname: The name of the file in the wheel.
+        :param content: The content of the file.
+        :param mode: The permissions of the file.
+        """
+        self._write(self._info(arcname, mode, 0), [content])
+
+    def write_tree(self, root: Path):
+        """Add the content of a folder to the wheel.
+
+        Files are added in a stable order, with the ``.dist-info`` folder last, as
+        recommended by the wheel specification.
+
+        :param root: The folder containing the unpacked content of the wheel.
+        """
+        files = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = Path(dirpath) / name
+                arcname = path.relative_to(root).as_posix()
+                # A RECORD in the folder is replaced by the RECORD of the wheel.
+                if arcname != f"{self.dist_info}/RECORD":
+                    files.append((arcname.startswith(f"{self.dist_info}/"), arcname))
+
+        for _, arcname in sorted(files):
+            self.write_file(arcname, root / arcname)
+
+    def close(self):
+        """Write the RECORD of the wheel, and move the wheel into place."""
+        record_name = f"{self.dist_info}/RECORD"
+        lines = [f"{name},{digest},{size}" for name, digest, size in self.records]
+        lines.append(f"{record_name},,")
+        self.zf.writestr(self._info(record_name, 0o644, 0), "\n".join(lines) + "\n")
+        self.zf.close()
+        self.partial_path.replace(self.path)
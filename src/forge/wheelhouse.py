@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from forge.cross import CrossVEnv
+
+# If True, the wheelhouse is never filled; installs can only use wheels that are
+# already in the wheelhouse, or in the local wheel paths.
+offline = False
+
+# The package index used to fill the wheelhouse. If None, pip's default is used.
+index_url = None
+
+# Only one fill of a given wheelhouse can happen at a time.
+_locks = defaultdict(threading.Lock)
+_locks_lock = threading.Lock()
+
+
+class Wheelhouse:
+    """A local store of third-party wheels, shared by every cross environment.
+
+    There is a wheelhouse for the build environment, and one for each host platform.
+    The first time a set of requirements is installed, ``pip wheel`` is used to
+    resolve the requirements, and to download or build every wheel they need. The
+    wheelhouse keeps a manifest of the requirement sets that have been filled, and the
+    wheels that were resolved for each one; every subsequent install of the same
+    requirements can be satisfied from the wheelhouse without using the network.
+
+    Wheels that are available from the local wheel paths (``dist``, ``deps`` and
+    ``published``) aren't kept in the wheelhouse, so a rebuilt local wheel is never
+    shadowed by a stale copy.
+    """
+
+    def __init__(self, cross_venv: CrossVEnv, build: bool):
+        """
+        :param cross_venv: The cross environment that will install the wheels.
+        :param build: Is the wheelhouse for the build environment? Defaults to the
+            host environment.
+        """
+        self.cross_venv = cross_venv
+        self.build = build
+
+    @property
+    def path(self) -> Path:
+        """The folder containing the wheels."""
+        platform = "build" if self.build else self.cross_venv.tag
+        return Path.cwd() / "wheelhouse" / f"cp3{sys.version_info.minor}-{platform}"
+
+    @property
+    def cache_path(self) -> Path:
+        """The pip cache shared by every wheelhouse."""
+        return Path.cwd() / "cache" / "pip"
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / "manifest.json"
+
+    def _load_manifest(self) -> dict[str, list[str]]:
+        try:
+            with self.manifest_path.open(encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _key(self, packages):
+        return hashlib.sha256(json.dumps(sorted(packages)).encode("utf-8")).hexdigest()
+
+    def is_filled(self, packages: list[str]) -> bool:
+        """Can a set of requirements be installed from the wheelhouse?
+
+        :param packages: The list of package names/specifiers to install.
+        """
+        try:
+            wheels = self._load_manifest()[self._key(packages)]
+        except KeyError:
+            return False
+
+        return all((self.path / wheel).is_file() for wheel in wheels)
+
+    def fill(
+        self,
+        logfile,
+        packages: list[str],
+        paths: list[Path] | None = None,
+    ):
+        """Ensure that the wheelhouse can satisfy a set of requirements.
+
+        :param logfile: An open file handle to which all output will be logged.
+        :param packages: The list of package names/specifiers to install.
+        :param paths: The paths containing local wheels that will be available to
+            the install.
+        """
+        if offline:
+            return
+
+        with _locks_lock:
+            lock = _locks[self.path]
+
+        with lock:
+            if self.is_filled(packages):
+                return
+
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            # pip saves every wheel it resolves into the wheel folder, including
+            # wheels that were already in the wheelhouse; resolving into an empty
+            # folder identifies the wheels that satisfy this set of requirements.
+            with tempfile.TemporaryDirectory(dir=self.path) as resolved:
+                self.cross_venv.run(
+                    logfile,
+                    self.cross_venv.pip_command(build=self.build)
+                    + [
+                        "wheel",
+                        "--disable-pip-version-check",
+                        "--wheel-dir",
+                        resolved,
+                        "--cache-dir",
+                        str(self.cache_path),
+                        "--find-links",
+                        str(self.path),
+                    ]
+                    + ([] if self.build else ["--only-binary", ":all:"])
+                    + (["--index-url", index_url] if index_url else [])
+                    + [
+                        arg
+                        for path in (paths or [])
+                        for arg in ["--find-links", str(path)]
+                    ]
+                    + packages,
+                )
+
+                # Local wheels will be installed from their original location.
+                local = {
+                    wheel.name for path in (paths or []) for wheel in path.glob("*.whl")
+                }
+                wheels = []
+                for wheel in sorted(Path(resolved).glob("*.whl")):
+                    if wheel.name not in local:
+                        shutil.move(wheel, self.path / wheel.name)
+                        wheels.append(wheel.name)
+
+            manifest = self._load_manifest()
+            manifest[self._key(packages)] = wheels
+            partial_path = self.manifest_path.with_suffix(".part")
+            with partial_path.open("w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=4)
+            partial_path.replace(self.manifest_path)
@@ -0,0 +1,26 @@
+import pytest
+
+from forge.archive import stripped_path
+
+
+@pytest.mark.parametrize(
+    "name, strip, expected",
+    [
+        ("pkg-1.0/setup.py", 1, "setup.py"),
+        ("pkg-1.0/src/module.c", 1, "src/module.c"),
+        ("pkg-1.0/src/", 1, "src/"),
+        ("pkg-1.0/", 1, None),
+        ("pkg-1.0", 1, None),
+        ("pkg-1.0/src/module.c", 2, "module.c"),
+        ("pkg-1.0/src/module.c", 0, "pkg-1.0/src/module.c"),
+        # A leading "./" is a component, as it is for tar --strip-components.
+        ("./pkg-1.0/setup.py", 1, "pkg-1.0/setup.py"),
+        ("./pkg-1.0/setup.py", 2, "setup.py"),
+        # Members that would be extracted outside the target are skipped.
+        ("pkg-1.0/../../etc/passwd", 1, None),
+        ("/etc/passwd", 0, None),
+        ("pkg-1.0//etc/passwd", 1, None),
+    ],
+)
+def test_stripped_path(name, strip, expected):
+    assert stripped_path(name, strip) == expected
@@ -0,0 +1,266 @@
+import base64
+import hashlib
+import shutil
+import struct
+import zipfile
+
+import pytest
+
+from forge import merge
+from forge.wheel import WheelWriter
+
+CPU_TYPE_X86_64 = 0x01000007
+CPU_SUBTYPE_X86_64_ALL = 3
+CPU_SUBTYPE_ARM64_ALL = 0
+
+DIST_INFO = "example-1.0.dist-info"
+
+
+def thin_mach_o(cputype, cpusubtype, payload=b""):
+    """A minimal thin 64-bit Mach-O binary for an architecture."""
+    return (
+        b"\xcf\xfa\xed\xfe" + struct.pack("<ii", cputype, cpusubtype) + payload
+    ).ljust(64, b"\0")
+
+
+ARM64 = thin_mach_o(merge.CPU_TYPE_ARM64, CPU_SUBTYPE_ARM64_ALL, b"arm64 code")
+X86_64 = thin_mach_o(CPU_TYPE_X86_64, CPU_SUBTYPE_X86_64_ALL, b"x86_64 code")
+
+
+def static_library(*objects):
+    """A BSD ar archive containing the given object files."""
+    content = merge.AR_MAGIC
+    for index, obj in enumerate(objects):
+        name = f"obj{index}.o".encode("ascii")
+        content += (
+            name.ljust(16)
+            + b"0".ljust(12)
+            + b"0".ljust(6)
+            + b"0".ljust(6)
+            + b"644".ljust(8)
+            + str(len(obj)).encode("ascii").ljust(10)
+            + b"`\n"
+        )
+        content += obj + (b"\n" if len(obj) % 2 else b"")
+    return content
+
+
+def write_wheel(path, files):
+    """Write a wheel for one architecture.
+
+    :param files: A dictionary of (content, mode) for each file in the wheel.
+    """
+    with WheelWriter(path, DIST_INFO) as writer:
+        for name, (content, mode) in files.items():
+            writer.write_bytes(name, content, mode=mode)
+    return path
+
+
+def arch_wheels(tmp_path, arm64_files=None, x86_64_files=None):
+    tag = "ios_13_0_{arch}_iphonesimulator"
+    wheels = []
+    for arch, binary, extra in [
+        ("arm64", ARM64, arm64_files),
+        ("x86_64", X86_64, x86_64_files),
+    ]:
+        files = {
+            "example/__init__.py": (b"", 0o644),
+            "example/_speedups.so": (binary, 0o755),
+            f"{DIST_INFO}/METADATA": (
+                b"Metadata-Version: 1.2\nName: example\nVersion: 1.0\n",
+                0o644,
+            ),
+            f"{DIST_INFO}/WHEEL": (
+                b"Wheel-Version: 1.0\nRoot-Is-Purelib: false\n"
+                + f"Tag: cp313-cp313-{tag.format(arch=arch)}\n".encode("ascii"),
+                0o644,
+            ),
+        }
+        files.update(extra or {})
+        wheels.append(
+            write_wheel(
+                tmp_path / f"example-1.0-cp313-cp313-{tag.format(arch=arch)}.whl",
+                files,
+            )
+        )
+    return wheels
+
+
+def test_thin_binary_slices():
+    assert merge.fat_slices(ARM64) == [
+        (merge.CPU_TYPE_ARM64, CPU_SUBTYPE_ARM64_ALL, ARM64)
+    ]
+    assert merge.is_mach_o(X86_64)
+
+
+def test_static_library_slices():
+    library = static_library(X86_64)
+    assert merge.fat_slices(library) == [
+        (CPU_TYPE_X86_64, CPU_SUBTYPE_X86_64_ALL, library)
+    ]
+
+
+def test_not_mach_o():
+    assert merge.fat_slices(b"#!/bin/sh\necho hello\n") is None
+    assert not merge.is_mach_o(b"")
+
+
+def test_python_merge(tmp_path):
+    (tmp_path / "arm64").write_bytes(ARM64)
+    (tmp_path / "x86_64").write_bytes(X86_64)
+
+    merge.PythonMergeMachO().merge(
+        [tmp_path / "x86_64", tmp_path / "arm64"], tmp_path / "fat"
+    )
+
+    fat = (tmp_path / "fat").read_bytes()
+    assert struct.unpack(">II", fat[:8]) == (merge.FAT_MAGIC, 2)
+    # Slices are sorted by architecture, and aligned to the architecture's page size.
+    slices = []
+    for index in range(2):
+        slices.append(struct.unpack(">iiIII", fat[8 + index * 20 : 28 + index * 20]))
+    assert [s[0] for s in slices] == [CPU_TYPE_X86_64, merge.CPU_TYPE_ARM64]
+    assert slices[0][2] % (1 << 12) == 0
+    assert slices[1][2] % (1 << 14) == 0
+
+    assert merge.fat_slices(fat) == [
+        (CPU_TYPE_X86_64, CPU_SUBTYPE_X86_64_ALL, X86_64),
+        (merge.CPU_TYPE_ARM64, CPU_SUBTYPE_ARM64_ALL, ARM64),
+    ]
+
+
+def test_python_merge_fat_source(tmp_path):
+    # A fat binary can be merged with another architecture.
+    (tmp_path / "arm64").write_bytes(ARM64)
+    (tmp_path / "x86_64").write_bytes(X86_64)
+    (tmp_path / "arm64_32").write_bytes(thin_mach_o(0x0200000C, 1))
+    merger = merge.PythonMergeMachO()
+    merger.merge([tmp_path / "arm64", tmp_path / "x86_64"], tmp_path / "fat")
+    merger.merge([tmp_path / "fat", tmp_path / "arm64_32"], tmp_path / "fatter")
+
+    slices = merge.fat_slices((tmp_path / "fatter").read_bytes())
+    assert len(slices) == 3
+
+
+def test_python_merge_duplicate_arch(tmp_path):
+    (tmp_path / "first").write_bytes(ARM64)
+    (tmp_path / "second").write_bytes(thin_mach_o(merge.CPU_TYPE_ARM64, 0, b"other"))
+
+    with pytest.raises(RuntimeError, match="duplicates an architecture"):
+        merge.PythonMergeMachO().merge(
+            [tmp_path / "first", tmp_path / "second"], tmp_path / "fat"
+        )
+
+
+def test_python_merge_not_mach_o(tmp_path):
+    (tmp_path / "arm64").write_bytes(ARM64)
+    (tmp_path / "script").write_bytes(b"#!/bin/sh\n")
+
+    with pytest.raises(RuntimeError, match="isn't a Mach-O binary"):
+        merge.PythonMergeMachO().merge(
+            [tmp_path / "arm64", tmp_path / "script"], tmp_path / "fat"
+        )
+
+
+@pytest.mark.skipif(shutil.which("lipo") is None, reason="lipo isn't available")
+def test_lipo_merge(tmp_path):
+    (tmp_path / "arm64").write_bytes(ARM64)
+    (tmp_path / "x86_64").write_bytes(X86_64)
+
+    merge.LipoMergeMachO().merge(
+        [tmp_path / "arm64", tmp_path / "x86_64"], tmp_path / "fat"
+    )
+
+    slices = merge.fat_slices((tmp_path / "fat").read_bytes())
+    assert {s[0] for s in slices} == {merge.CPU_TYPE_ARM64, CPU_TYPE_X86_64}
+
+
+def test_get_merger():
+    assert isinstance(merge.get_merger("python"), merge.PythonMergeMachO)
+    assert isinstance(merge.get_merger("lipo"), merge.LipoMergeMachO)
+    expected = merge.LipoMergeMachO if shutil.which("lipo") else merge.PythonMergeMachO
+    assert isinstance(merge.get_merger(), expected)
+
+
+def test_merged_wheel_name(tmp_path):
+    wheels = [
+        tmp_path / "example-1.0-1-cp313-cp313-ios_13_0_x86_64_iphonesimulator.whl",
+        tmp_path / "example-1.0-1-cp313-cp313-ios_13_0_arm64_iphonesimulator.whl",
+    ]
+    assert merge.merged_wheel_name(wheels) == (
+        "example-1.0-1-cp313-cp313-"
+        "ios_13_0_arm64_iphonesimulator.ios_13_0_x86_64_iphonesimulator.whl"
+    )
+
+
+def test_merge_wheels(tmp_path):
+    wheels = arch_wheels(
+        tmp_path,
+        arm64_files={"example/lib/libfoo.a": (static_library(ARM64), 0o644)},
+        x86_64_files={"example/lib/libfoo.a": (static_library(X86_64), 0o644)},
+    )
+
+    target = merge.merge_wheels(wheels, tmp_path / "merged", merger="python")
+
+    assert target.name == (
+        "example-1.0-cp313-cp313-"
+        "ios_13_0_arm64_iphonesimulator.ios_13_0_x86_64_iphonesimulator.whl"
+    )
+    assert not target.with_name(f"{target.name}.part").exists()
+
+    with zipfile.ZipFile(target) as zf:
+        names = zf.namelist()
+        # The .dist-info folder is last, and the RECORD is the last file.
+        assert names[-1] == f"{DIST_INFO}/RECORD"
+        assert all(name.startswith(DIST_INFO) for name in names[-3:])
+
+        # Binaries are merged; identical files are copied.
+        extension = merge.fat_slices(zf.read("example/_speedups.so"))
+        assert {s[0] for s in extension} == {merge.CPU_TYPE_ARM64, CPU_TYPE_X86_64}
+        library = merge.fat_slices(zf.read("example/lib/libfoo.a"))
+        assert {s[0] for s in library} == {merge.CPU_TYPE_ARM64, CPU_TYPE_X86_64}
+        assert zf.read("example/__init__.py") == b""
+
+        # File modes are preserved.
+        assert zf.getinfo("example/_speedups.so").external_attr >> 16 & 0o777 == 0o755
+
+        # The WHEEL lists the tags of both architectures.
+        wheel = zf.read(f"{DIST_INFO}/WHEEL").decode("utf-8").splitlines()
+        assert [line for line in wheel if line.startswith("Tag:")] == [
+            "Tag: cp313-cp313-ios_13_0_arm64_iphonesimulator",
+            "Tag: cp313-cp313-ios_13_0_x86_64_iphonesimulator",
+        ]
+        assert "Wheel-Version: 1.0" in wheel
+
+        # The RECORD is regenerated, and describes the merged content.
+        record = zf.read(f"{DIST_INFO}/RECORD").decode("utf-8").splitlines()
+        assert record[-1] == f"{DIST_INFO}/RECORD,,"
+        entries = [line.split(",") for line in record[:-1]]
+        assert sorted(name for name, _, _ in entries) == sorted(names[:-1])
+        for name, digest, size in entries:
+            content = zf.read(name)
+            expected = base64.urlsafe_b64encode(hashlib.sha256(content).digest())
+            assert digest == "sha256=" + expected.rstrip(b"=").decode("ascii")
+            assert int(size) == len(content)
+
+
+def test_merge_wheels_conflict(tmp_path):
+    wheels = arch_wheels(
+        tmp_path,
+        arm64_files={"example/config.py": (b"ARCH = 'arm64'\n", 0o644)},
+        x86_64_files={"example/config.py": (b"ARCH = 'x86_64'\n", 0o644)},
+    )
+
+    with pytest.raises(RuntimeError, match="Can't merge example/config.py"):
+        merge.merge_wheels(wheels, tmp_path / "merged", merger="python")
+
+    assert not list((tmp_path / "merged").glob("*"))
+
+
+def test_merge_wheels_without_wheel_file(tmp_path):
+    wheels = arch_wheels(tmp_path)
+    with zipfile.ZipFile(wheels[1], "w") as zf:
+        zf.writestr("example/_speedups.so", X86_64)
+
+    with pytest.raises(RuntimeError, match=f"{wheels[1].name} doesn't contain"):
+        merge.merge_wheels(wheels, tmp_path / "merged", merger="python")
@@ -0,0 +1,76 @@
+from forge import triage
+
+
+def run(analyzer, args, lines, return_code=0):
+    """Feed the output of a command to an analyzer."""
+    analyzer.start_command(args)
+    analyzer.feed(lines)
+    if return_code:
+        analyzer.command_failed(return_code)
+
+
+def test_root_cause():
+    analyzer = triage.Analyzer()
+    run(
+        analyzer,
+        ["make"],
+        [
+            "cc -c foo.c",
+            "foo.c:1:10: fatal error: 'zlib.h' file not found",
+            "make: *** [foo.o] Error 1",
+        ],
+        return_code=2,
+    )
+
+    assert analyzer.root_cause.category == "missing header"
+    assert analyzer.root_cause.subject == "zlib.h"
+    assert analyzer.summary()[:2] == [
+        "Root cause: missing header: foo.c:1:10: fatal error: 'zlib.h' file not found",
+        "  while running: make",
+    ]
+
+
+def test_findings_of_successful_commands_are_discarded():
+    analyzer = triage.Analyzer()
+    # Harmless errors in commands that succeed, more than the per-command limit.
+    for index in range(3):
+        run(
+            analyzer,
+            ["./configure"],
+            [f"conftest.c:{n}: error: probe {index}-{n} failed" for n in range(10)],
+        )
+    run(
+        analyzer,
+        ["make"],
+        ["ld: error: undefined symbol: _png_read_info"],
+        return_code=2,
+    )
+
+    assert analyzer.root_cause.category == "linker error"
+    assert analyzer.root_cause.command == "make"
+    assert all(finding.command == "make" for finding in analyzer.findings)
+
+
+def test_failure_without_findings_shows_tail():
+    analyzer = triage.Analyzer()
+    run(analyzer, ["./configure"], ["error: optional feature disabled"])
+    run(analyzer, ["make"], ["building", "stopped"], return_code=1)
+
+    assert analyzer.root_cause is None
+    assert analyzer.summary() == [
+        "Command failed with return code 1: make",
+        "  | building",
+        "  | stopped",
+    ]
+
+
+def test_findings_are_limited_per_command():
+    analyzer = triage.Analyzer()
+    run(
+        analyzer,
+        ["make"],
+        [f"foo.c:{n}:1: error: problem {n}" for n in range(20)],
+        return_code=2,
+    )
+
+    assert len(analyzer.findings) == triage.MAX_FINDINGS